@@ -0,0 +1,137 @@
+import argparse
+import io
+import json
+import math
+import os
+import shutil
+import sys
+import time
+
+# Пакетный анализ без интерфейса: python -m app data.csv --output result.json
+# pandas и модули анализа импортируются после разбора аргументов, sklearn и matplotlib
+# не импортируются вовсе, поэтому запуск (в том числе --help) занимает доли секунды.
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m app', description="Пакетный анализ исторических данных о температуре")
+    parser.add_argument('data', help="CSV с историческими данными или каталог колоночного набора (storage.columnar_store)")
+    parser.add_argument('--cities', nargs='+', default=None, help="города для анализа (по умолчанию все)")
+    parser.add_argument('--workers', type=int, default=1, help="число процессов; больше 1 - параллельный анализ")
+    parser.add_argument('--window', type=int, default=30, help="окно скользящего среднего, точек")
+    parser.add_argument('--n-std', type=float, default=2, help="порог аномалии в стандартных отклонениях")
+    parser.add_argument('--output', default=None, help="файл JSON (по умолчанию stdout) или каталог для --format columnar")
+    parser.add_argument('--format', choices=('json', 'columnar'), default='json')
+    args = parser.parse_args(argv)
+    if args.format == 'columnar' and not args.output:
+        parser.error("для --format columnar нужен --output")
+    return parser, args
+
+# Загрузка данных: из колоночного набора читаются только строки выбранных городов
+def load_data(path, cities=None):
+    import pandas as pd
+    from .storage.columnar_store import ColumnarDataset, content_hash
+
+    if os.path.isdir(path):
+        dataset = ColumnarDataset(path)
+        if cities is None:
+            return dataset.to_frame(), dataset.dataset_hash
+        frames = [dataset.load_city(city) for city in cities if city in dataset.cities]
+        if not frames:
+            return pd.DataFrame(columns=[column['name'] for column in dataset.meta['columns']]), dataset.dataset_hash
+        return pd.concat(frames, ignore_index=True), dataset.dataset_hash
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+    df = pd.read_csv(io.BytesIO(raw), parse_dates=['timestamp'])
+    if cities is not None:
+        df = df[df['city'].isin(cities)]
+    return df, content_hash(raw)
+
+def _number(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+# Таблицы результатов: сводка по городам, профили сезонов и аномалии
+def result_tables(results):
+    import pandas as pd
+
+    summary = pd.DataFrame([{
+        'city': result['city'],
+        'trend_slope': float(result['trend_slope']),
+        'avg_temp': float(result['avg_temp']),
+        'min_temp': float(result['min_temp']),
+        'max_temp': float(result['max_temp']),
+        'anomalies': len(result['anomalies']),
+    } for result in results])
+
+    profiles = []
+    for result in results:
+        roll_profile = result['season_roll_profile']
+        roll_profile = roll_profile.set_axis(['_'.join(column) for column in roll_profile.columns], axis=1)
+        profile = result['season_profile'].join(roll_profile)
+        profiles.append(profile.rename_axis('season').reset_index().assign(city=result['city']))
+    season_profiles = pd.concat(profiles, ignore_index=True) if profiles else pd.DataFrame()
+    if profiles:
+        season_profiles = season_profiles[['city'] + [column for column in season_profiles.columns if column != 'city']]
+
+    anomaly_columns = ['city', 'timestamp', 'season', 'temperature', '30_day_roll_mean', '30_day_roll_std']
+    anomalies = pd.concat([result['anomalies'][anomaly_columns] for result in results], ignore_index=True) if results else pd.DataFrame(columns=anomaly_columns)
+    anomalies = anomalies.astype({'city': str, 'season': str})
+    return summary, season_profiles, anomalies
+
+def to_json(dataset_hash, summary, season_profiles, anomalies):
+    def records(frame):
+        return [{key: _number(value) if isinstance(value, float) else value for key, value in row.items()}
+                for row in frame.to_dict('records')]
+
+    anomalies = anomalies.assign(timestamp=anomalies['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S'))
+    return {
+        'dataset': dataset_hash,
+        'summary': records(summary),
+        'season_profiles': records(season_profiles),
+        'anomalies': records(anomalies),
+    }
+
+# Колоночный вывод: по каталогу на таблицу в формате storage.columnar_store (читается ColumnarDataset)
+def write_columnar(path, dataset_hash, tables):
+    from .storage.columnar_store import write_frame
+
+    os.makedirs(path, exist_ok=True)
+    for name, frame in tables.items():
+        table_path = os.path.join(path, name)
+        if os.path.exists(table_path):
+            shutil.rmtree(table_path)
+        write_frame(frame, table_path, dataset_hash)
+
+def main(argv=None):
+    parser, args = parse_args(argv)
+
+    from .analysis.data_analysis import analyze_all_cities, analyze_cities_parallel
+
+    start = time.perf_counter()
+    df, dataset_hash = load_data(args.data, args.cities)
+    if args.cities is not None:
+        missing = sorted(set(args.cities) - set(df['city'].unique()))
+        if missing:
+            parser.error(f"Нет данных для городов: {', '.join(missing)}")
+    cities = list(args.cities) if args.cities is not None else list(df['city'].unique())
+
+    if args.workers > 1:
+        results, _ = analyze_cities_parallel(df, cities, workers=args.workers, window=args.window, n_std=args.n_std)
+    else:
+        by_city = analyze_all_cities(df, window=args.window, n_std=args.n_std)
+        results = [by_city[city] for city in cities]
+    summary, season_profiles, anomalies = result_tables(results)
+
+    if args.format == 'columnar':
+        write_columnar(args.output, dataset_hash, {'summary': summary, 'season_profiles': season_profiles, 'anomalies': anomalies})
+    else:
+        output = json.dumps(to_json(dataset_hash, summary, season_profiles, anomalies), ensure_ascii=False)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output)
+        else:
+            sys.stdout.write(output + '\n')
+    print(f"Городов: {len(results)}, аномалий: {len(anomalies)}, время: {time.perf_counter() - start:.2f} с", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
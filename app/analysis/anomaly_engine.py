@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+METHODS = ('zscore', 'mad', 'iqr', 'seasonal')
+
+# Масштаб MAD, при котором для нормального распределения он совпадает со ст. отклонением
+MAD_SCALE = 1.4826
+
+# Поиск аномалий сразу для нескольких окон и методов за один проход по данным:
+# - zscore: |t - скользящее среднее| > n_std * скользящее ст. откл. (как в analyze_city);
+#   среднее и дисперсия по окну - из накопленных сумм t и t^2 за O(1) на точку;
+# - mad: |t - скользящая медиана| > robust_k * 1.4826 * MAD по окну;
+# - iqr: t вне [Q1 - iqr_k * IQR, Q3 + iqr_k * IQR] по окну;
+# - seasonal: |t - среднее сезона| > n_std * ст. откл. сезона по всей истории города
+#   (правило is_temperature_normal, окно в таблице равно 0).
+# Медианы и квартили считаются по окнам sliding_window_view блоками по block_rows строк.
+# Окно включает текущую точку, значения появляются с window-й точки города.
+# Результат - компактная таблица только аномальных точек: город, дата, температура,
+# метод, окно и оценка (отклонение в единицах масштаба метода).
+def detect_anomalies(df, windows=(7, 30, 90), methods=METHODS, n_std=2, robust_k=3.0, iqr_k=1.5, block_rows=16384):
+    unknown = set(methods) - set(METHODS)
+    if unknown:
+        raise ValueError(f"Неизвестные методы: {sorted(unknown)}")
+
+    # Одна стабильная сортировка по городу
+    codes, cities = pd.factorize(df['city'])
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    temps = df['temperature'].to_numpy(dtype=np.float64)[order]
+    timestamps = pd.to_datetime(df['timestamp']).to_numpy()[order]
+    counts = np.bincount(codes, minlength=len(cities))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    position = np.arange(len(temps)) - np.repeat(starts, counts)
+
+    # Накопленные суммы по отклонениям от среднего города (меньше потеря точности).
+    # Пропуски (NaN) в суммы не входят; окно с пропуском, как в pandas rolling, не оценивается
+    valid = np.isfinite(temps)
+    valid_counts = np.bincount(codes, valid, minlength=len(cities))
+    city_means = np.bincount(codes, np.where(valid, temps, 0.0), minlength=len(cities)) / np.maximum(valid_counts, 1)
+    centered = np.where(valid, temps - city_means[codes], 0.0)
+    sum1 = np.concatenate(([0.0], np.cumsum(centered)))
+    sum2 = np.concatenate(([0.0], np.cumsum(centered ** 2)))
+    sum_valid = np.concatenate(([0], np.cumsum(valid)))
+
+    found = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for window in windows:
+            ends = np.flatnonzero(position >= window - 1)
+            # Окно длиннее истории любого города
+            if len(ends) == 0:
+                continue
+            if 'zscore' in methods:
+                s1 = sum1[ends + 1] - sum1[ends + 1 - window]
+                s2 = sum2[ends + 1] - sum2[ends + 1 - window]
+                mean = s1 / window
+                std = np.sqrt(np.maximum((s2 - s1 * s1 / window) / (window - 1), 0.0))
+                std[sum_valid[ends + 1] - sum_valid[ends + 1 - window] < window] = np.nan
+                deviation = np.abs(centered[ends] - mean)
+                flag = deviation > n_std * std
+                found.append(('zscore', window, ends[flag], (deviation / std)[flag]))
+
+            if 'mad' in methods or 'iqr' in methods:
+                view = sliding_window_view(temps, window)
+                for block in range(0, len(ends), block_rows):
+                    block_ends = ends[block:block + block_rows]
+                    values = view[block_ends - window + 1]
+                    current = temps[block_ends]
+                    if 'mad' in methods:
+                        median = np.median(values, axis=1)
+                        mad = MAD_SCALE * np.median(np.abs(values - median[:, None]), axis=1)
+                        score = np.abs(current - median) / mad
+                        flag = np.abs(current - median) > robust_k * mad
+                        found.append(('mad', window, block_ends[flag], score[flag]))
+                    if 'iqr' in methods:
+                        q1, q3 = np.percentile(values, [25, 75], axis=1)
+                        iqr = q3 - q1
+                        excess = np.maximum(q1 - current, current - q3)
+                        flag = excess > iqr_k * iqr
+                        found.append(('iqr', window, block_ends[flag], (excess / iqr)[flag]))
+
+        if 'seasonal' in methods:
+            season_codes, seasons = pd.factorize(df['season'].to_numpy()[order])
+            key = codes * len(seasons) + season_codes
+            size = len(cities) * len(seasons)
+            n = np.bincount(key, valid, minlength=size)
+            mean = np.bincount(key, np.where(valid, temps, 0.0), minlength=size) / n
+            std = np.sqrt(np.bincount(key, np.where(valid, temps - mean[key], 0.0) ** 2, minlength=size) / (n - 1))
+            deviation = np.abs(temps - mean[key])
+            flag = deviation > n_std * std[key]
+            found.append(('seasonal', 0, np.flatnonzero(flag), (deviation / std[key])[flag]))
+
+    rows = np.concatenate([indices for _, _, indices, _ in found]) if found else np.empty(0, dtype=np.int64)
+    return pd.DataFrame({
+        'city': pd.Categorical.from_codes(codes[rows], cities),
+        'timestamp': timestamps[rows],
+        'temperature': temps[rows].astype(np.float32),
+        'method': pd.Categorical.from_codes(
+            np.concatenate([np.full(len(indices), METHODS.index(method), dtype=np.int8) for method, _, indices, _ in found] or [np.empty(0, np.int8)]),
+            METHODS),
+        'window': np.concatenate([np.full(len(indices), window, dtype=np.int16) for _, window, indices, _ in found] or [np.empty(0, np.int16)]),
+        'score': np.concatenate([score for _, _, _, score in found] or [np.empty(0)]).astype(np.float32),
+    })
+
+# Число аномалий по городам для каждой пары (метод, окно) - для сравнения настроек
+def anomaly_counts(table):
+    return table.groupby(['city', 'method', 'window'], observed=True).size().unstack(['method', 'window'], fill_value=0)
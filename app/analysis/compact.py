@@ -0,0 +1,107 @@
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+
+RESULT_KEYS = ('city', 'trend_slope', 'avg_temp', 'min_temp', 'max_temp',
+               'season_profile', 'season_roll_profile', 'anomalies', 'city_data')
+
+# Компактное представление входных данных: город и сезон - категории, температура - float32.
+# Строка занимает ~14 байт (дата 8, температура 4, коды категорий 1-2) вместо ~140 байт
+# со строковыми колонками.
+def compact_frame(df):
+    df = df.copy()
+    df['city'] = df['city'].astype('category')
+    df['season'] = df['season'].astype('category')
+    df['temperature'] = df['temperature'].astype(np.float32)
+    return df
+
+# Компактный результат анализа города с тем же набором ключей, что у analyze_city.
+# Хранятся только даты (datetime64, 8 байт), температуры (float32, 4 байта), коды сезонов
+# (int8, 1 байт) и флаги аномалий битовой маской (1/8 байта) - около 13.1 МБ на миллион строк
+# плюс небольшие профили сезонов. Обычный результат хранит ~180 байт на строку в city_data
+# (строковые город/сезон, шесть колонок float64/int64 и bool), то есть примерно в 14 раз больше.
+# city_data и anomalies строятся заново при каждом обращении: скользящие колонки
+# пересчитываются по float32-температурам, флаги аномалий берутся из сохраненной маски.
+class CompactCityResult(Mapping):
+    def __init__(self, city, trend_slope, avg_temp, min_temp, max_temp, season_profile, season_roll_profile,
+                 timestamps, temperatures, season_codes, season_categories, anomaly_bits, window=30):
+        self.summary = {
+            'city': city,
+            'trend_slope': trend_slope,
+            'avg_temp': avg_temp,
+            'min_temp': min_temp,
+            'max_temp': max_temp,
+            'season_profile': season_profile,
+            'season_roll_profile': season_roll_profile,
+        }
+        self.timestamps = timestamps
+        self.temperatures = temperatures
+        self.season_codes = season_codes
+        self.season_categories = season_categories
+        self.anomaly_bits = anomaly_bits
+        self.window = window
+
+    @classmethod
+    def from_result(cls, result, window=30):
+        city_data = result['city_data']
+        seasons = pd.Categorical(city_data['season'])
+        return cls(
+            result['city'], result['trend_slope'], result['avg_temp'], result['min_temp'], result['max_temp'],
+            result['season_profile'], result['season_roll_profile'],
+            timestamps=pd.to_datetime(city_data['timestamp']).to_numpy(),
+            temperatures=city_data['temperature'].to_numpy(dtype=np.float32),
+            season_codes=seasons.codes.astype(np.int8),
+            season_categories=list(seasons.categories),
+            anomaly_bits=np.packbits(city_data['anomaly'].to_numpy(dtype=bool)),
+            window=window,
+        )
+
+    def __len__(self):
+        return len(RESULT_KEYS)
+
+    def __iter__(self):
+        return iter(RESULT_KEYS)
+
+    def __getitem__(self, key):
+        if key == 'city_data':
+            return self.city_data()
+        if key == 'anomalies':
+            return self.anomalies()
+        return self.summary[key]
+
+    @property
+    def anomaly_mask(self):
+        return np.unpackbits(self.anomaly_bits, count=len(self.temperatures)).astype(bool)
+
+    # Объем хранимых массивов в байтах
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.temperatures.nbytes + self.season_codes.nbytes + self.anomaly_bits.nbytes
+
+    # Исходные колонки, скользящие среднее/ст. отклонение и флаг аномалии
+    def _base_frame(self):
+        n = len(self.temperatures)
+        frame = pd.DataFrame({
+            'city': pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [self.summary['city']]),
+            'timestamp': self.timestamps,
+            'temperature': self.temperatures,
+            'season': pd.Categorical.from_codes(self.season_codes, self.season_categories),
+        })
+        rolling = frame['temperature'].rolling(window=self.window)
+        frame['30_day_roll_mean'] = rolling.mean()
+        frame['30_day_roll_std'] = rolling.std()
+        frame['anomaly'] = self.anomaly_mask
+        return frame
+
+    # Данные города в формате analyze_city; производные колонки вычисляются при обращении
+    def city_data(self):
+        city_data = self._base_frame()
+        season_rolling = city_data.groupby('season', observed=True)['temperature'].rolling(window=self.window)
+        city_data['season_roll_mean'] = season_rolling.mean().reset_index(level=0, drop=True)
+        city_data['season_roll_std'] = season_rolling.std().reset_index(level=0, drop=True)
+        city_data['days'] = (city_data['timestamp'] - city_data['timestamp'].min()).dt.days
+        return city_data
+
+    def anomalies(self):
+        frame = self._base_frame()
+        return frame[frame['anomaly']]
@@ -1,44 +1,62 @@
-from sklearn.linear_model import LinearRegression
 import pandas as pd
+import numpy as np
+import os
 import time
-import matplotlib.pyplot as plt
-import seaborn as sns
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from .compact import CompactCityResult
+try:
+    from ..profiling import stage
+except ImportError:
+    # Запуск из app/ (streamlit run app/app_streamlit.py): пакеты app/ - верхнего уровня
+    from profiling import stage
 
-def analyze_city(df, city):
+# sklearn, matplotlib и seaborn импортируются внутри функций: импорт модуля без них
+# занимает доли секунды (пакетный запуск python -m app, дочерние процессы пула)
+
+def analyze_city(df, city, window=30, n_std=2, compact=False):
     # Фильтрация данных по городу
-    city_data = df[df['city'] == city].copy()
+    with stage('analyze_city.filter'):
+        city_data = df[df['city'] == city].copy()
 
     # Скользящее среднее и стандартное отклонение
-    city_data['30_day_roll_mean'] = city_data['temperature'].rolling(window=30).mean()
-    city_data['30_day_roll_std'] = city_data['temperature'].rolling(window=30).std()
+    with stage('analyze_city.rolling'):
+        city_data['30_day_roll_mean'] = city_data['temperature'].rolling(window=window).mean()
+        city_data['30_day_roll_std'] = city_data['temperature'].rolling(window=window).std()
 
     # Аномалии
-    city_data['anomaly'] = (city_data['temperature'] - city_data['30_day_roll_mean']).abs() > 2 * city_data['30_day_roll_std']
-    anomalies = city_data[city_data['anomaly']]
+    with stage('analyze_city.anomalies'):
+        city_data['anomaly'] = (city_data['temperature'] - city_data['30_day_roll_mean']).abs() > n_std * city_data['30_day_roll_std']
+        anomalies = city_data[city_data['anomaly']]
 
     # Профиль сезона
-    season_profile = city_data.groupby('season')['temperature'].agg(['mean', 'std'])
+    with stage('analyze_city.season_profile'):
+        season_profile = city_data.groupby('season', observed=True)['temperature'].agg(['mean', 'std'])
 
     # Сезонный профиль с учетом скользящего окна
-    city_data['season_roll_mean'] = city_data.groupby('season')['temperature'].rolling(window=30).mean().reset_index(level=0, drop=True)
-    city_data['season_roll_std'] = city_data.groupby('season')['temperature'].rolling(window=30).std().reset_index(level=0, drop=True)
-    season_roll_profile = city_data.groupby('season')[['season_roll_mean', 'season_roll_std']].agg(['mean', 'std'])
+    with stage('analyze_city.season_rolling'):
+        city_data['season_roll_mean'] = city_data.groupby('season', observed=True)['temperature'].rolling(window=window).mean().reset_index(level=0, drop=True)
+        city_data['season_roll_std'] = city_data.groupby('season', observed=True)['temperature'].rolling(window=window).std().reset_index(level=0, drop=True)
+        season_roll_profile = city_data.groupby('season', observed=True)[['season_roll_mean', 'season_roll_std']].agg(['mean', 'std'])
 
     # Линейная регрессия
-    city_data['timestamp'] = pd.to_datetime(city_data['timestamp'])
-    city_data['days'] = (city_data['timestamp'] - city_data['timestamp'].min()).dt.days
-    X = city_data[['days']]
-    y = city_data['temperature']
-    model = LinearRegression()
-    model.fit(X, y)
-    trend_slope = model.coef_[0]
+    with stage('analyze_city.regression'):
+        from sklearn.linear_model import LinearRegression
+        city_data['timestamp'] = pd.to_datetime(city_data['timestamp'])
+        city_data['days'] = (city_data['timestamp'] - city_data['timestamp'].min()).dt.days
+        X = city_data[['days']]
+        y = city_data['temperature']
+        model = LinearRegression()
+        model.fit(X, y)
+        trend_slope = model.coef_[0]
 
     # Основные показатели температуры
-    avg_temp = city_data['temperature'].mean()
-    min_temp = city_data['temperature'].min()
-    max_temp = city_data['temperature'].max()
+    with stage('analyze_city.summary'):
+        avg_temp = city_data['temperature'].mean()
+        min_temp = city_data['temperature'].min()
+        max_temp = city_data['temperature'].max()
 
-    return {
+    result = {
         'city': city,
         'trend_slope': trend_slope,
         'avg_temp': avg_temp,
@@ -49,21 +67,183 @@ def analyze_city(df, city):
         'anomalies': anomalies,
         'city_data': city_data
     }
+    # Компактный режим: вместо city_data хранятся только исходные колонки и битовая маска аномалий
+    return CompactCityResult.from_result(result, window) if compact else result
+
+# Анализ всех городов за один проход: одна стабильная сортировка по городу,
+# затем групповые векторные вычисления вместо фильтрации кадра на каждый город
+def analyze_all_cities(df, cities=None, window=30, n_std=2, compact=False):
+    if cities is not None:
+        df = df[df['city'].isin(cities)]
+
+    # Стабильная сортировка сохраняет исходный порядок строк внутри города
+    codes, uniques = pd.factorize(df['city'])
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=len(uniques))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    data = df.iloc[order]
+    original_index = data.index
+    data = data.reset_index(drop=True)
+    data['timestamp'] = pd.to_datetime(data['timestamp'])
+    by_city = data.groupby('city', sort=False, observed=True)['temperature']
+
+    # Скользящее среднее и стандартное отклонение
+    rolling = by_city.rolling(window=window)
+    data['30_day_roll_mean'] = rolling.mean().reset_index(level=0, drop=True)
+    data['30_day_roll_std'] = rolling.std().reset_index(level=0, drop=True)
+
+    # Аномалии
+    data['anomaly'] = (data['temperature'] - data['30_day_roll_mean']).abs() > n_std * data['30_day_roll_std']
+    anomaly_columns = list(data.columns)
+
+    # Профиль сезона
+    season_profile = data.groupby(['city', 'season'], observed=True)['temperature'].agg(['mean', 'std'])
+
+    # Сезонный профиль с учетом скользящего окна
+    season_rolling = data.groupby(['city', 'season'], sort=False, observed=True)['temperature'].rolling(window=window)
+    data['season_roll_mean'] = season_rolling.mean().reset_index(level=[0, 1], drop=True)
+    data['season_roll_std'] = season_rolling.std().reset_index(level=[0, 1], drop=True)
+    season_roll_profile = data.groupby(['city', 'season'], observed=True)[['season_roll_mean', 'season_roll_std']].agg(['mean', 'std'])
+
+    # Наклон тренда по формуле МНК: cov(days, t) / var(days) для каждого города
+    data['days'] = (data['timestamp'] - data.groupby('city', sort=False, observed=True)['timestamp'].transform('min')).dt.days
+    days_dev = data['days'] - data.groupby('city', sort=False, observed=True)['days'].transform('mean')
+    temp_dev = data['temperature'] - by_city.transform('mean')
+    sums = pd.DataFrame({'city': data['city'], 'cov': days_dev * temp_dev, 'var': days_dev ** 2}).groupby('city', sort=False, observed=True).sum()
+    trend_slopes = (sums['cov'] / sums['var'].where(sums['var'] > 0)).fillna(0.0)
+
+    # Основные показатели температуры
+    stats = by_city.agg(['mean', 'min', 'max'])
+
+    season_profiles = {city: profile.droplevel('city') for city, profile in season_profile.groupby(level='city', sort=False, observed=True)}
+    season_roll_profiles = {city: profile.droplevel('city') for city, profile in season_roll_profile.groupby(level='city', sort=False, observed=True)}
+
+    data.index = original_index
+    results = {}
+    for code, city in enumerate(uniques):
+        city_data = data.iloc[offsets[code]:offsets[code + 1]]
+        results[city] = {
+            'city': city,
+            'trend_slope': trend_slopes[city],
+            'avg_temp': stats.at[city, 'mean'],
+            'min_temp': stats.at[city, 'min'],
+            'max_temp': stats.at[city, 'max'],
+            'season_profile': season_profiles[city],
+            'season_roll_profile': season_roll_profiles[city],
+            'anomalies': city_data.loc[city_data['anomaly'], anomaly_columns],
+            'city_data': city_data
+        }
+        if compact:
+            results[city] = CompactCityResult.from_result(results[city], window)
+    return results
 
 # Последовательный режим
-def analyze_cities_sequential(df, cities):
+def analyze_cities_sequential(df, cities, compact=False):
     results = []
     start_time = time.time()
     
     for city in cities:
-        result = analyze_city(df, city)
+        result = analyze_city(df, city, compact=compact)
         results.append(result)
     
     elapsed_time = time.time() - start_time
     return results, elapsed_time
 
+# Размещение колонок кадра в одном блоке разделяемой памяти.
+# Строковые колонки передаются кодами, а словарь значений - в описании колонок;
+# даты с часовым поясом - как datetime64 в UTC, пояс - в описании колонок.
+# В памяти оказываются только числовые массивы без ссылок на объекты Python
+def _share_columns(frame):
+    arrays = []
+    for name in frame.columns:
+        column = frame[name]
+        tz = None
+        if isinstance(column.dtype, pd.DatetimeTZDtype):
+            tz = column.dt.tz
+            column = column.dt.tz_convert('UTC').dt.tz_localize(None)
+        values = column.to_numpy()
+        if values.dtype.kind in 'biufcmM':
+            arrays.append((name, values, None, tz))
+        else:
+            codes, uniques = pd.factorize(column)
+            arrays.append((name, codes.astype(np.int32), pd.Index(uniques), None))
+
+    spec = []
+    size = 0
+    for name, values, uniques, tz in arrays:
+        spec.append((name, values.dtype.str, size, uniques, tz))
+        size += -(-values.nbytes // 8) * 8
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for (name, values, _, _), (_, dtype, offset, _, _) in zip(arrays, spec):
+        np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf, offset=offset)[:] = values
+    return shm, spec
+
+# Анализ части городов в дочернем процессе: строки [start, stop) читаются
+# прямо из разделяемой памяти, полный DataFrame не сериализуется
+def _analyze_partition(shm_name, spec, n_rows, start, stop, compact=False, window=30, n_std=2):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        columns = {}
+        for name, dtype, offset, uniques, tz in spec:
+            values = np.ndarray((n_rows,), dtype=dtype, buffer=shm.buf, offset=offset)[start:stop].copy()
+            if uniques is not None:
+                # Код -1 (пропуск) остается пропуском, а не последним значением словаря
+                values = uniques.take(values, allow_fill=True, fill_value=np.nan)
+            elif tz is not None:
+                values = pd.DatetimeIndex(values).tz_localize('UTC').tz_convert(tz)
+            columns[name] = values
+        frame = pd.DataFrame(columns, index=pd.RangeIndex(start, stop))
+    finally:
+        shm.close()
+    return list(analyze_all_cities(frame, window=window, n_std=n_std, compact=compact).values())
+
+# Параллельный режим на пуле процессов
+def analyze_cities_parallel(df, cities, workers=None, compact=False, window=30, n_std=2):
+    start_time = time.time()
+    workers = workers or os.cpu_count() or 1
+
+    # Строки группируются по городам в порядке списка cities
+    data = df[df['city'].isin(cities)]
+    city_codes = pd.Categorical(data['city'], categories=pd.unique(np.asarray(cities, dtype=object))).codes
+    order = np.argsort(city_codes, kind='stable')
+    data = data.iloc[order]
+    labels = data.index
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(city_codes, minlength=len(cities)))))
+
+    # Разбиение на непрерывные диапазоны городов примерно равного числа строк
+    n_rows = len(data)
+    n_parts = min(workers * 4, len(cities)) or 1
+    bounds = np.searchsorted(offsets, np.linspace(0, n_rows, n_parts + 1), side='left')
+    bounds = np.unique(np.concatenate(([0], bounds, [len(offsets) - 1])))
+
+    shm, spec = _share_columns(data)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_analyze_partition, shm.name, spec, n_rows, offsets[lo], offsets[hi], compact, window, n_std)
+                for lo, hi in zip(bounds[:-1], bounds[1:]) if offsets[hi] > offsets[lo]
+            ]
+            results = []
+            for future in futures:
+                for result in future.result():
+                    # Восстановление исходных меток строк (компактные результаты меток не хранят)
+                    if not compact:
+                        for key in ('city_data', 'anomalies'):
+                            result[key].index = labels[result[key].index]
+                    results.append(result)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    elapsed_time = time.time() - start_time
+    return results, elapsed_time
+
 # Визуализация анализа города
 def display_city_analysis(results):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     city = results['city']
     trend_slope = results['trend_slope']
     avg_temp = results['avg_temp']
@@ -0,0 +1,292 @@
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# Сопоставление месяцев с сезонами
+month_to_season = {12: "winter", 1: "winter", 2: "winter",
+                   3: "spring", 4: "spring", 5: "spring",
+                   6: "summer", 7: "summer", 8: "summer",
+                   9: "autumn", 10: "autumn", 11: "autumn"}
+
+# Накопитель count/mean/M2/min/max по Уэлфорду; два накопителя объединяются формулой Чана
+class RunningStats:
+    def __init__(self, count=0, mean=0.0, m2=0.0, min=math.inf, max=-math.inf):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return cls()
+        mean = values.mean()
+        return cls(len(values), float(mean), float(((values - mean) ** 2).sum()), float(values.min()), float(values.max()))
+
+    def push(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def avg(self):
+        return self.mean if self.count else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(**state)
+
+# Накопитель для наклона линейной регрессии y = a + b*x: средние и ко-моменты вместо сумм
+# квадратов (устойчиво для длинных рядов). При объединении x второго накопителя сдвигается на shift.
+class RunningRegression:
+    def __init__(self, count=0, mean_x=0.0, mean_y=0.0, c_xy=0.0, m2_x=0.0):
+        self.count = count
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.c_xy = c_xy
+        self.m2_x = m2_x
+
+    @classmethod
+    def from_values(cls, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(x) == 0:
+            return cls()
+        mean_x = x.mean()
+        mean_y = y.mean()
+        dx = x - mean_x
+        return cls(len(x), float(mean_x), float(mean_y), float((dx * (y - mean_y)).sum()), float((dx ** 2).sum()))
+
+    def push(self, x, y):
+        self.count += 1
+        dx = x - self.mean_x
+        self.mean_x += dx / self.count
+        self.mean_y += (y - self.mean_y) / self.count
+        self.c_xy += dx * (y - self.mean_y)
+        self.m2_x += dx * (x - self.mean_x)
+
+    def merge(self, other, shift=0.0):
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        dx = other.mean_x + shift - self.mean_x
+        dy = other.mean_y - self.mean_y
+        factor = self.count * other.count / count
+        self.mean_x += dx * other.count / count
+        self.mean_y += dy * other.count / count
+        self.c_xy += other.c_xy + dx * dy * factor
+        self.m2_x += other.m2_x + dx ** 2 * factor
+        self.count = count
+        return self
+
+    @property
+    def slope(self):
+        return self.c_xy / self.m2_x if self.m2_x > 0 else 0.0
+
+    def to_dict(self):
+        return {'count': self.count, 'mean_x': self.mean_x, 'mean_y': self.mean_y, 'c_xy': self.c_xy, 'm2_x': self.m2_x}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(**state)
+
+# Скользящие среднее и ст. отклонение (ddof=1) по окну; NaN, пока окно не заполнено
+def _window_stats(values, window):
+    if len(values) < window:
+        return math.nan, math.nan
+    values = np.fromiter(values, dtype=np.float64, count=len(values))
+    return float(values.mean()), float(values.std(ddof=1))
+
+# Пошаговый анализ одного города: новые наблюдения добавляются без пересчета истории.
+# Одно наблюдение обрабатывается за O(window), пакет через extend - векторно.
+# Результат совпадает с analyze_city по тем же данным (кроме city_data: история не хранится).
+# Наблюдения должны поступать в хронологическом порядке.
+class IncrementalCityAnalyzer:
+    def __init__(self, city, window=30, n_std=2):
+        self.city = city
+        self.window = window
+        self.n_std = n_std
+        self.first_timestamp = None
+        self.stats = RunningStats()
+        self.regression = RunningRegression()
+        self.season_stats = {}
+        self.season_roll_mean_stats = {}
+        self.season_roll_std_stats = {}
+        self.recent = deque(maxlen=window)
+        self.season_recent = {}
+        self.anomalies = []
+
+    @classmethod
+    def from_history(cls, df, city, window=30, n_std=2):
+        analyzer = cls(city, window, n_std)
+        analyzer.extend(df[df['city'] == city])
+        return analyzer
+
+    def _season_state(self, season):
+        if season not in self.season_stats:
+            self.season_stats[season] = RunningStats()
+            self.season_roll_mean_stats[season] = RunningStats()
+            self.season_roll_std_stats[season] = RunningStats()
+            self.season_recent[season] = deque(maxlen=self.window)
+        return self.season_recent[season]
+
+    # Добавление одного наблюдения; возвращает True, если оно аномально
+    def update(self, timestamp, temperature, season=None):
+        timestamp = pd.Timestamp(timestamp)
+        temperature = float(temperature)
+        season = season or month_to_season[timestamp.month]
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+
+        self.stats.push(temperature)
+        self.regression.push((timestamp - self.first_timestamp).days, temperature)
+        season_recent = self._season_state(season)
+        self.season_stats[season].push(temperature)
+
+        # Скользящее окно по городу и аномалия
+        self.recent.append(temperature)
+        roll_mean, roll_std = _window_stats(self.recent, self.window)
+        anomaly = abs(temperature - roll_mean) > self.n_std * roll_std
+        if anomaly:
+            self.anomalies.append((timestamp, temperature, season, roll_mean, roll_std))
+
+        # Скользящее окно внутри сезона
+        season_recent.append(temperature)
+        season_mean, season_std = _window_stats(season_recent, self.window)
+        if not math.isnan(season_mean):
+            self.season_roll_mean_stats[season].push(season_mean)
+        if not math.isnan(season_std):
+            self.season_roll_std_stats[season].push(season_std)
+        return anomaly
+
+    # Добавление пакета наблюдений (DataFrame с колонками timestamp, temperature, season).
+    # Хвосты окон из состояния подставляются перед пакетом, поэтому скользящие значения
+    # на стыке совпадают с расчетом по всей истории.
+    def extend(self, frame):
+        if len(frame) == 0:
+            return
+        timestamps = pd.to_datetime(frame['timestamp']).reset_index(drop=True)
+        temps = frame['temperature'].to_numpy(dtype=np.float64)
+        seasons = frame['season'].to_numpy() if 'season' in frame else timestamps.dt.month.map(month_to_season).to_numpy()
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamps.iloc[0]
+
+        self.stats.merge(RunningStats.from_values(temps))
+        days = ((timestamps - self.first_timestamp) // pd.Timedelta(days=1)).to_numpy()
+        self.regression.merge(RunningRegression.from_values(days, temps))
+
+        # Скользящее окно по городу и аномалии
+        tail = np.fromiter(self.recent, dtype=np.float64, count=len(self.recent))
+        rolling = pd.Series(np.concatenate((tail, temps))).rolling(window=self.window)
+        roll_mean = rolling.mean().to_numpy()[len(tail):]
+        roll_std = rolling.std().to_numpy()[len(tail):]
+        anomaly = np.abs(temps - roll_mean) > self.n_std * roll_std
+        for i in np.flatnonzero(anomaly):
+            self.anomalies.append((timestamps.iloc[i], float(temps[i]), seasons[i], float(roll_mean[i]), float(roll_std[i])))
+        self.recent.extend(temps[-self.window:].tolist())
+
+        # Сезонные накопители и скользящие окна внутри сезона
+        for season in pd.unique(seasons):
+            values = temps[seasons == season]
+            season_recent = self._season_state(season)
+            self.season_stats[season].merge(RunningStats.from_values(values))
+            tail = np.fromiter(season_recent, dtype=np.float64, count=len(season_recent))
+            rolling = pd.Series(np.concatenate((tail, values))).rolling(window=self.window)
+            season_mean = rolling.mean().to_numpy()[len(tail):]
+            season_std = rolling.std().to_numpy()[len(tail):]
+            self.season_roll_mean_stats[season].merge(RunningStats.from_values(season_mean[~np.isnan(season_mean)]))
+            self.season_roll_std_stats[season].merge(RunningStats.from_values(season_std[~np.isnan(season_std)]))
+            season_recent.extend(values[-self.window:].tolist())
+
+    # Результат в формате analyze_city
+    def result(self):
+        seasons = sorted(self.season_stats)
+        season_profile = pd.DataFrame(
+            {'mean': [self.season_stats[s].avg for s in seasons], 'std': [self.season_stats[s].std for s in seasons]},
+            index=pd.Index(seasons, name='season')
+        )
+        season_roll_profile = pd.DataFrame(
+            {
+                ('season_roll_mean', 'mean'): [self.season_roll_mean_stats[s].avg for s in seasons],
+                ('season_roll_mean', 'std'): [self.season_roll_mean_stats[s].std for s in seasons],
+                ('season_roll_std', 'mean'): [self.season_roll_std_stats[s].avg for s in seasons],
+                ('season_roll_std', 'std'): [self.season_roll_std_stats[s].std for s in seasons],
+            },
+            index=pd.Index(seasons, name='season')
+        )
+        anomalies = pd.DataFrame(self.anomalies, columns=['timestamp', 'temperature', 'season', '30_day_roll_mean', '30_day_roll_std'])
+        anomalies.insert(0, 'city', self.city)
+        anomalies['anomaly'] = True
+        return {
+            'city': self.city,
+            'trend_slope': self.regression.slope,
+            'avg_temp': self.stats.avg,
+            'min_temp': self.stats.min if self.stats.count else math.nan,
+            'max_temp': self.stats.max if self.stats.count else math.nan,
+            'season_profile': season_profile,
+            'season_roll_profile': season_roll_profile,
+            'anomalies': anomalies
+        }
+
+    # Состояние в виде JSON-совместимого словаря (для сохранения между перезапусками)
+    def to_dict(self):
+        return {
+            'city': self.city,
+            'window': self.window,
+            'n_std': self.n_std,
+            'first_timestamp': None if self.first_timestamp is None else self.first_timestamp.isoformat(),
+            'stats': self.stats.to_dict(),
+            'regression': self.regression.to_dict(),
+            'seasons': {
+                season: {
+                    'stats': self.season_stats[season].to_dict(),
+                    'roll_mean_stats': self.season_roll_mean_stats[season].to_dict(),
+                    'roll_std_stats': self.season_roll_std_stats[season].to_dict(),
+                    'recent': list(self.season_recent[season]),
+                }
+                for season in self.season_stats
+            },
+            'recent': list(self.recent),
+            'anomalies': [[ts.isoformat(), temp, season, mean, std] for ts, temp, season, mean, std in self.anomalies],
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        analyzer = cls(state['city'], state['window'], state['n_std'])
+        if state['first_timestamp'] is not None:
+            analyzer.first_timestamp = pd.Timestamp(state['first_timestamp'])
+        analyzer.stats = RunningStats.from_dict(state['stats'])
+        analyzer.regression = RunningRegression.from_dict(state['regression'])
+        for season, season_state in state['seasons'].items():
+            analyzer._season_state(season).extend(season_state['recent'])
+            analyzer.season_stats[season] = RunningStats.from_dict(season_state['stats'])
+            analyzer.season_roll_mean_stats[season] = RunningStats.from_dict(season_state['roll_mean_stats'])
+            analyzer.season_roll_std_stats[season] = RunningStats.from_dict(season_state['roll_std_stats'])
+        analyzer.recent.extend(state['recent'])
+        analyzer.anomalies = [(pd.Timestamp(ts), temp, season, mean, std) for ts, temp, season, mean, std in state['anomalies']]
+        return analyzer
@@ -0,0 +1,120 @@
+import logging
+import threading
+from collections import OrderedDict
+import pandas as pd
+from .data_analysis import analyze_city, analyze_all_cities
+
+logger = logging.getLogger(__name__)
+
+# Оценка размера результата анализа в байтах (по данным DataFrame внутри результата,
+# строковые колонки - с учетом самих строк). Компактный результат сообщает объем сам
+def result_nbytes(result):
+    if hasattr(result, 'nbytes'):
+        return int(result.nbytes)
+    size = 0
+    for value in result.values():
+        if isinstance(value, pd.DataFrame):
+            size += int(value.memory_usage(index=True, deep=True).sum())
+    return size
+
+# Кэш результатов analyze_city с вытеснением давно неиспользуемых записей (LRU).
+# Ключ - (хэш набора данных, город, параметры анализа); ограничены и число записей, и объем.
+# Объект потокобезопасен и может разделяться между сессиями Streamlit.
+class AnalysisCache:
+    def __init__(self, max_entries=256, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._warming = {}
+
+    @staticmethod
+    def _key(dataset_hash, city, params):
+        return dataset_hash, city, tuple(sorted(params.items()))
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, dataset_hash, city, **params):
+        key = self._key(dataset_hash, city, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, dataset_hash, city, result, **params):
+        self._put(self._key(dataset_hash, city, params), result, result_nbytes(result), evict=True)
+
+    # Добавление записи; при evict=False запись не вытесняет другие и отбрасывается, если не помещается
+    def _put(self, key, result, size, evict):
+        with self._lock:
+            if size > self.max_bytes:
+                return False
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if not evict and (len(self._entries) >= self.max_entries or self._bytes + size > self.max_bytes):
+                return False
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+            return True
+
+    # Результат из кэша или новый расчет; load_city(city) возвращает данные города
+    def get_or_compute(self, dataset_hash, city, load_city, **params):
+        result = self.get(dataset_hash, city, **params)
+        if result is None:
+            result = analyze_city(load_city(city), city, **params)
+            self.put(dataset_hash, city, result, **params)
+        return result
+
+    # Фоновый предварительный расчет всех городов набора за один проход analyze_all_cities.
+    # Записи добавляются, пока есть место, и не вытесняют уже просмотренные города.
+    def warm(self, dataset_hash, load_frame, cities=None, **params):
+        warm_key = (dataset_hash, tuple(sorted(params.items())))
+        with self._lock:
+            thread = self._warming.get(warm_key)
+            if thread is not None:
+                return thread
+
+            def run():
+                try:
+                    results = analyze_all_cities(load_frame(), cities, **params)
+                    for city, result in results.items():
+                        # Копия отвязывает данные города от общего кадра, чтобы вытеснение освобождало память
+                        # (компактный результат хранит собственные массивы)
+                        if isinstance(result, dict):
+                            result['city_data'] = result['city_data'].copy()
+                        key = self._key(dataset_hash, city, params)
+                        if key not in self._entries and not self._put(key, result, result_nbytes(result), evict=False):
+                            break
+                except Exception:
+                    logger.exception("Ошибка фонового расчета набора %s", dataset_hash)
+                finally:
+                    # Завершенный (в том числе с ошибкой) прогрев можно запустить снова
+                    with self._lock:
+                        if self._warming.get(warm_key) is threading.current_thread():
+                            del self._warming[warm_key]
+
+            thread = threading.Thread(target=run, name=f'analysis-warm-{dataset_hash[:8]}', daemon=True)
+            self._warming[warm_key] = thread
+        thread.start()
+        return thread
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._warming.clear()
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+from .incremental import IncrementalCityAnalyzer, RunningRegression, RunningStats
+
+# Потоковый анализ истории, не помещающейся в память: данные читаются порциями,
+# по каждому городу и сезону копятся объединяемые агрегаты (count/mean/M2/min/max,
+# ко-моменты регрессии), а хвосты скользящих окон переносятся между порциями,
+# поэтому аномалии совпадают с расчетом analyze_city по всей истории.
+# Память ограничена размером порции, числом городов и числом найденных аномалий.
+# Внутри города строки должны идти в хронологическом порядке.
+class StreamingAnalyzer:
+    def __init__(self, window=30, n_std=2):
+        self.window = window
+        self.n_std = n_std
+        self.analyzers = {}
+
+    def _analyzer(self, city):
+        if city not in self.analyzers:
+            self.analyzers[city] = IncrementalCityAnalyzer(city, self.window, self.n_std)
+        return self.analyzers[city]
+
+    # Скользящие среднее и ст. отклонение по группам keys с подстановкой хвостов окон из состояния
+    def _rolling(self, chunk, keys, tails):
+        tail_frame = pd.DataFrame(
+            [key + (value,) for key, values in tails.items() for value in values],
+            columns=keys + ['temperature']
+        )
+        frame = pd.concat([tail_frame, chunk[keys + ['temperature']]], ignore_index=True)
+        rolling = frame.groupby(keys, sort=False, observed=True)['temperature'].rolling(window=self.window)
+        levels = list(range(len(keys)))
+        roll_mean = rolling.mean().reset_index(level=levels, drop=True).sort_index().to_numpy()[len(tail_frame):]
+        roll_std = rolling.std().reset_index(level=levels, drop=True).sort_index().to_numpy()[len(tail_frame):]
+        return roll_mean, roll_std
+
+    # Обработка очередной порции (DataFrame с колонками city, timestamp, temperature, season)
+    def update(self, chunk):
+        if len(chunk) == 0:
+            return
+        chunk = pd.DataFrame({
+            'city': chunk['city'].to_numpy(),
+            'timestamp': pd.to_datetime(chunk['timestamp']).to_numpy(),
+            'temperature': chunk['temperature'].to_numpy(dtype=np.float64),
+            'season': chunk['season'].to_numpy(),
+        })
+        for city, first_timestamp in chunk.groupby('city', sort=False)['timestamp'].first().items():
+            analyzer = self._analyzer(city)
+            if analyzer.first_timestamp is None:
+                analyzer.first_timestamp = pd.Timestamp(first_timestamp)
+        cities = pd.unique(chunk['city'])
+
+        # Скользящее окно по городу и аномалии
+        tails = {(city,): list(self.analyzers[city].recent) for city in cities}
+        roll_mean, roll_std = self._rolling(chunk, ['city'], tails)
+        anomaly = np.abs(chunk['temperature'].to_numpy() - roll_mean) > self.n_std * roll_std
+        anomalies = chunk[anomaly].assign(roll_mean=roll_mean[anomaly], roll_std=roll_std[anomaly])
+        for city, rows in anomalies.groupby('city', sort=False):
+            self.analyzers[city].anomalies.extend(
+                (pd.Timestamp(ts), float(temp), season, float(mean), float(std))
+                for ts, temp, season, mean, std in zip(rows['timestamp'], rows['temperature'], rows['season'], rows['roll_mean'], rows['roll_std'])
+            )
+
+        # Скользящее окно внутри сезона
+        season_keys = chunk[['city', 'season']].drop_duplicates().itertuples(index=False, name=None)
+        season_tails = {}
+        for city, season in season_keys:
+            season_tails[(city, season)] = list(self.analyzers[city]._season_state(season))
+        season_mean, season_std = self._rolling(chunk, ['city', 'season'], season_tails)
+
+        # Агрегаты по (город, сезон) и профиль сезонного скользящего окна
+        chunk['season_roll_mean'] = season_mean
+        chunk['season_roll_std'] = season_std
+        by_season = chunk.groupby(['city', 'season'], sort=False)
+        temperature = by_season['temperature'].agg(['count', 'mean', 'var', 'min', 'max'])
+        roll_mean_stats = by_season['season_roll_mean'].agg(['count', 'mean', 'var'])
+        roll_std_stats = by_season['season_roll_std'].agg(['count', 'mean', 'var'])
+        for (city, season), row in temperature.iterrows():
+            analyzer = self.analyzers[city]
+            stats = RunningStats(int(row['count']), row['mean'], np.nan_to_num(row['var']) * (row['count'] - 1), row['min'], row['max'])
+            analyzer.season_stats[season].merge(stats)
+            analyzer.stats.merge(RunningStats(stats.count, stats.mean, stats.m2, stats.min, stats.max))
+            for target, source in ((analyzer.season_roll_mean_stats, roll_mean_stats), (analyzer.season_roll_std_stats, roll_std_stats)):
+                count, mean, var = source.loc[(city, season)]
+                if count:
+                    target[season].merge(RunningStats(int(count), mean, np.nan_to_num(var) * (count - 1)))
+
+        # Ко-моменты регрессии по дням от первого наблюдения города
+        first = pd.Series({city: self.analyzers[city].first_timestamp for city in cities})
+        chunk['days'] = ((chunk['timestamp'] - chunk['city'].map(first)) // pd.Timedelta(days=1)).astype(np.float64)
+        by_city = chunk.groupby('city', sort=False)
+        days_dev = chunk['days'] - by_city['days'].transform('mean')
+        temp_dev = chunk['temperature'] - by_city['temperature'].transform('mean')
+        moments = pd.DataFrame({
+            'city': chunk['city'],
+            'count': 1,
+            'mean_x': chunk['days'],
+            'mean_y': chunk['temperature'],
+            'c_xy': days_dev * temp_dev,
+            'm2_x': days_dev ** 2,
+        }).groupby('city', sort=False).agg({'count': 'sum', 'mean_x': 'mean', 'mean_y': 'mean', 'c_xy': 'sum', 'm2_x': 'sum'})
+        for city, row in moments.iterrows():
+            self.analyzers[city].regression.merge(RunningRegression(int(row['count']), row['mean_x'], row['mean_y'], row['c_xy'], row['m2_x']))
+
+        # Новые хвосты окон
+        for city, values in by_city['temperature']:
+            self.analyzers[city].recent.extend(values.to_numpy()[-self.window:].tolist())
+        for (city, season), values in by_season['temperature']:
+            self.analyzers[city].season_recent[season].extend(values.to_numpy()[-self.window:].tolist())
+
+    # Объединение с анализатором другого процесса. Для общих городов other должен содержать
+    # более поздний участок истории; аномалии точны, если города не делятся между процессами.
+    def merge(self, other):
+        for city, theirs in other.analyzers.items():
+            if city not in self.analyzers:
+                self.analyzers[city] = theirs
+                continue
+            ours = self.analyzers[city]
+            shift = (theirs.first_timestamp - ours.first_timestamp) // pd.Timedelta(days=1)
+            ours.stats.merge(theirs.stats)
+            ours.regression.merge(theirs.regression, shift)
+            for season in theirs.season_stats:
+                ours._season_state(season)
+                ours.season_stats[season].merge(theirs.season_stats[season])
+                ours.season_roll_mean_stats[season].merge(theirs.season_roll_mean_stats[season])
+                ours.season_roll_std_stats[season].merge(theirs.season_roll_std_stats[season])
+                ours.season_recent[season] = theirs.season_recent[season]
+            ours.recent = theirs.recent
+            ours.anomalies.extend(theirs.anomalies)
+        return self
+
+    # Результаты в формате analyze_city (без city_data)
+    def results(self):
+        return {city: analyzer.result() for city, analyzer in self.analyzers.items()}
+
+    def to_dict(self):
+        return {'window': self.window, 'n_std': self.n_std,
+                'cities': {city: analyzer.to_dict() for city, analyzer in self.analyzers.items()}}
+
+    @classmethod
+    def from_dict(cls, state):
+        streaming = cls(state['window'], state['n_std'])
+        streaming.analyzers = {city: IncrementalCityAnalyzer.from_dict(city_state) for city, city_state in state['cities'].items()}
+        return streaming
+
+# Анализ последовательности порций (например, ColumnarDataset.iter_chunks или pd.read_csv(chunksize=...))
+def analyze_chunks(chunks, window=30, n_std=2):
+    streaming = StreamingAnalyzer(window, n_std)
+    for chunk in chunks:
+        streaming.update(chunk)
+    return streaming
+
+# Потоковый анализ CSV-файла порциями по chunksize строк
+def analyze_csv_chunked(path, chunksize=1_000_000, window=30, n_std=2):
+    chunks = pd.read_csv(path, chunksize=chunksize, parse_dates=['timestamp'])
+    return analyze_chunks(chunks, window, n_std).results()
@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import collections
+import json
+import os
+import tempfile
+import time
+from .season_norms import SeasonNormIndex
+from .weather_api import BASE_URL, AsyncRateLimiter, WeatherClient, month_to_season
+
+# Журнал по умолчанию; панель мониторинга читает его по тому же пути (или из WEATHER_MONITOR_LOG)
+DEFAULT_LOG_PATH = os.environ.get('WEATHER_MONITOR_LOG', os.path.join(tempfile.gettempdir(), 'weather_monitor.jsonl'))
+
+# Поток результатов проверок: кольцевой буфер последних записей в памяти
+# и журнал только на дозапись (одна JSON-запись на строку). Журнал больше max_bytes
+# переименовывается в <path>.1 (предыдущая копия заменяется), запись продолжается в новый файл
+class AlertLog:
+    def __init__(self, path=DEFAULT_LOG_PATH, maxlen=10000, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.recent = collections.deque(maxlen=maxlen)
+        self.max_bytes = max_bytes
+
+    def append(self, records):
+        self.recent.extend(records)
+        if self.path:
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + '.1')
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+    def anomalies(self, city=None):
+        return [record for record in self.recent if record['normal'] is False and (city is None or record['city'] == city)]
+
+# Чтение последних записей журнала без чтения всего файла (блоками с конца).
+# Просматривается не больше max_scan_bytes с конца файла; недописанная строка
+# (монитор дописывает журнал в это время) пропускается
+def read_alert_log(path=DEFAULT_LOG_PATH, limit=100, city=None, anomalies_only=True, block_size=64 * 1024,
+                   max_scan_bytes=8 * 1024 * 1024):
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        stop = max(0, position - max_scan_bytes)
+        remainder = b''
+        while position > stop and len(records) < limit:
+            size = min(block_size, position - stop)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b'\n')
+            remainder = lines.pop(0) if position > 0 else b''
+            for line in reversed(lines):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if anomalies_only and record['normal'] is not False:
+                    continue
+                if city is not None and record['city'] != city:
+                    continue
+                records.append(record)
+                if len(records) == limit:
+                    break
+    return records
+
+# Фоновый мониторинг: по расписанию опрашивает все города через get_city_weather_async
+# (ограничения на число соединений и частоту запросов задаются в клиенте) и проверяет
+# показания цикла одним пакетным вызовом SeasonNormIndex.check_batch (границы те же,
+# что у is_temperature_normal), поэтому исходные данные процессу не нужны
+class WeatherMonitor:
+    def __init__(self, client, norms, interval=600, alert_log=None):
+        self.client = client
+        self.norms = norms
+        self.cities = list(norms.cities)
+        self.interval = interval
+        self.alert_log = alert_log or AlertLog()
+
+    def _record(self, city, reading, normal=None, error=None):
+        if isinstance(reading, Exception):
+            return {'city': city, 'timestamp': None, 'temperature': None, 'season': None, 'normal': None, 'error': str(reading)}
+        temperature, current_datetime = reading
+        return {
+            'city': city,
+            'timestamp': current_datetime.isoformat(),
+            'temperature': temperature,
+            'season': month_to_season[current_datetime.month],
+            'normal': normal,
+            'error': error,
+        }
+
+    # Проверка успешных показаний: один вызов check_batch; если для части городов
+    # нет норм сезона, такие показания проверяются по одному и получают ошибку
+    def _classify(self, readings):
+        cities = [city for city in self.cities if not isinstance(readings[city], Exception)]
+        if not cities:
+            return {}
+        temps = [readings[city][0] for city in cities]
+        timestamps = [readings[city][1] for city in cities]
+        try:
+            normal = self.norms.check_batch(cities, temps, timestamps)
+            return {city: (bool(value), None) for city, value in zip(cities, normal)}
+        except ValueError:
+            results = {}
+            for city, temperature, current_datetime in zip(cities, temps, timestamps):
+                try:
+                    results[city] = (bool(self.norms.is_normal(city, temperature, current_datetime)), None)
+                except ValueError as e:
+                    results[city] = (None, str(e))
+            return results
+
+    # Один цикл опроса всех городов
+    async def poll_once(self):
+        readings = await self.client.fetch_many_async(self.cities)
+        checks = self._classify(readings)
+        records = [self._record(city, readings[city], *checks.get(city, (None, None))) for city in self.cities]
+        self.alert_log.append(records)
+        return records
+
+    # Опрос с периодом interval; iterations=None - бесконечно
+    async def run(self, iterations=None):
+        cycle = 0
+        while iterations is None or cycle < iterations:
+            start = time.monotonic()
+            records = await self.poll_once()
+            elapsed = time.monotonic() - start
+            anomalies = sum(record['normal'] is False for record in records)
+            errors = sum(record['error'] is not None for record in records)
+            print(f"Цикл {cycle + 1}: {len(records)} городов за {elapsed:.1f} с, аномалий: {anomalies}, ошибок: {errors}")
+            if elapsed > self.interval:
+                print(f"Цикл опроса длиннее интервала ({elapsed:.0f} > {self.interval} с): увеличьте интервал или лимит запросов")
+            cycle += 1
+            if iterations is None or cycle < iterations:
+                await asyncio.sleep(max(0.0, self.interval - elapsed))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Фоновый мониторинг температуры по всем городам набора данных")
+    parser.add_argument('data', nargs='?', help="CSV с историческими данными (не нужен при --norms)")
+    parser.add_argument('--norms', help="файл .npz с границами норм (SeasonNormIndex.save)")
+    parser.add_argument('--save-norms', help="сохранить границы, построенные по CSV, в файл .npz")
+    parser.add_argument('--api-key', default=os.environ.get('OPENWEATHER_API_KEY'))
+    parser.add_argument('--interval', type=float, default=600, help="период опроса, с")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--rate-limit', type=float, default=60, help="запросов в минуту (лимит тарифа API)")
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--log', default=DEFAULT_LOG_PATH)
+    parser.add_argument('--iterations', type=int, default=None)
+    args = parser.parse_args(argv)
+    if not args.api_key:
+        parser.error("нужен API ключ: --api-key или OPENWEATHER_API_KEY")
+    if (args.data is None) == (args.norms is None):
+        parser.error("укажите либо CSV с историческими данными, либо --norms")
+
+    if args.norms:
+        norms = SeasonNormIndex.load(args.norms)
+    else:
+        import pandas as pd
+        norms = SeasonNormIndex.from_history(pd.read_csv(args.data))
+        if args.save_norms:
+            norms.save(args.save_norms)
+
+    # TTL меньше интервала, чтобы каждый цикл получал свежие данные
+    client = WeatherClient(args.api_key, args.base_url, ttl=args.interval / 2, concurrency=args.concurrency,
+                           rate_limiter=AsyncRateLimiter(args.rate_limit))
+    monitor = WeatherMonitor(client, norms, args.interval, AlertLog(args.log))
+
+    # Одна асинхронная сессия на все циклы опроса, закрывается в том же цикле событий
+    async def run():
+        try:
+            await monitor.run(args.iterations)
+        finally:
+            await client.aclose()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from .weather_api import month_to_season
+
+SEASONS = ['winter', 'spring', 'summer', 'autumn']
+
+# Код сезона для каждого месяца (индекс 0 не используется)
+MONTH_TO_SEASON_CODE = np.array([-1] + [SEASONS.index(month_to_season[month]) for month in range(1, 13)], dtype=np.int8)
+
+# Предрасчитанные границы нормальной температуры (город, сезон) -> (нижняя, верхняя).
+# Границы считаются так же, как в is_temperature_normal: среднее ± n_std стандартных отклонений.
+# Одиночная проверка - поиск в словаре, пакетная - индексирование массивов NumPy.
+class SeasonNormIndex:
+    def __init__(self, cities, lower, upper, known, n_std=2):
+        self.cities = [str(city) for city in cities]
+        self.n_std = n_std
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.known = np.asarray(known, dtype=bool)
+        self._city_index = pd.Index(self.cities)
+        self._bounds = {
+            (city, season): (self.lower[i, j], self.upper[i, j])
+            for i, city in enumerate(self.cities)
+            for j, season in enumerate(SEASONS)
+            if self.known[i, j]
+        }
+
+    # Построение по профилям сезонов вида season_profile (индекс - сезон, колонки mean/std)
+    @classmethod
+    def from_season_profiles(cls, season_profiles, n_std=2):
+        cities = list(season_profiles)
+        mean = np.full((len(cities), len(SEASONS)), np.nan)
+        std = np.full((len(cities), len(SEASONS)), np.nan)
+        known = np.zeros((len(cities), len(SEASONS)), dtype=bool)
+        for i, city in enumerate(cities):
+            profile = season_profiles[city]
+            for j, season in enumerate(SEASONS):
+                if season in profile.index:
+                    mean[i, j] = profile.loc[season, 'mean']
+                    std[i, j] = profile.loc[season, 'std']
+                    known[i, j] = True
+        return cls(cities, mean - n_std * std, mean + n_std * std, known, n_std)
+
+    # Построение по историческим данным: одна группировка по (город, сезон)
+    @classmethod
+    def from_history(cls, df, n_std=2):
+        profile = df.groupby(['city', 'season'])['temperature'].agg(['mean', 'std'])
+        cities = profile.index.get_level_values('city').unique()
+        full = profile.reindex(pd.MultiIndex.from_product([cities, SEASONS], names=['city', 'season']))
+        known = full['mean'].notna().to_numpy().reshape(len(cities), len(SEASONS))
+        mean = full['mean'].to_numpy().reshape(len(cities), len(SEASONS))
+        std = full['std'].to_numpy().reshape(len(cities), len(SEASONS))
+        return cls(cities, mean - n_std * std, mean + n_std * std, known, n_std)
+
+    def bounds(self, city, season):
+        try:
+            return self._bounds[(city, season)]
+        except KeyError:
+            raise ValueError(f"Нет данных для города {city} и сезона {season}") from None
+
+    def is_normal(self, city, current_temp, current_datetime):
+        lower_bound, upper_bound = self.bounds(city, month_to_season.get(current_datetime.month))
+        return lower_bound <= current_temp <= upper_bound
+
+    # Пакетная проверка: массивы городов, температур и моментов времени одинаковой длины
+    def check_batch(self, cities, temps, timestamps):
+        positions = self._city_index.get_indexer(cities)
+        seasons = MONTH_TO_SEASON_CODE[pd.DatetimeIndex(timestamps).month.to_numpy()]
+        temps = np.asarray(temps, dtype=np.float64)
+
+        missing = positions < 0
+        missing[~missing] = ~self.known[positions[~missing], seasons[~missing]]
+        if missing.any():
+            city = np.asarray(cities, dtype=object)[missing][0]
+            season = SEASONS[seasons[missing][0]]
+            raise ValueError(f"Нет данных для города {city} и сезона {season} ({int(missing.sum())} показаний без норм)")
+
+        return (self.lower[positions, seasons] <= temps) & (temps <= self.upper[positions, seasons])
+
+    # Сохранение в .npz, чтобы процессу мониторинга не требовались исходные данные
+    def save(self, path):
+        np.savez(path, cities=np.asarray(self.cities, dtype=str), lower=self.lower, upper=self.upper,
+                 known=self.known, n_std=self.n_std)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['cities'].tolist(), data['lower'], data['upper'], data['known'], data['n_std'].item())
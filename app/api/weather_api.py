@@ -2,7 +2,14 @@ import aiohttp
 import asyncio
 import time
 import datetime
+import threading
 import requests
+import requests.adapters
+try:
+    from ..profiling import stage
+except ImportError:
+    # Запуск из app/ (streamlit run app/app_streamlit.py): пакеты app/ - верхнего уровня
+    from profiling import stage
 
 # Сопоставление месяцев с сезонами
 month_to_season = {12: "winter", 1: "winter", 2: "winter",
@@ -10,10 +17,29 @@ month_to_season = {12: "winter", 1: "winter", 2: "winter",
                    6: "summer", 7: "summer", 8: "summer",
                    9: "autumn", 10: "autumn", 11: "autumn"}
 
+BASE_URL = 'https://api.openweathermap.org/data/2.5/weather'
+
+# Ошибка ответа API: код статуса и пауза из заголовка Retry-After (если есть)
+class WeatherAPIError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+def _retry_after(headers):
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+def _request_params(API_KEY, city):
+    return {'q': city, 'appid': API_KEY, 'units': 'metric'}
+
 # Использование OpenWeatherMap API для получения текущей температуры города
-def get_city_weather(API_KEY, city):
-    URL = f'https://api.openweathermap.org/data/2.5/weather?q={city}&appid={API_KEY}&units=metric'
-    response = requests.get(URL)
+def get_city_weather(API_KEY, city, session=None, base_url=BASE_URL, timeout=10):
+    http = session or requests
+    with stage('api.request'):
+        response = http.get(base_url, params=_request_params(API_KEY, city), timeout=timeout)
     current_datetime = datetime.datetime.now()
 
     if response.status_code == 200:
@@ -21,25 +47,189 @@ def get_city_weather(API_KEY, city):
         temperature = data['main']['temp']
         return temperature, current_datetime
     else:
-        raise Exception(response.text)
+        raise WeatherAPIError(response.text, response.status_code, _retry_after(response.headers))
 
 # Асинхронное обращение к API
-async def get_city_weather_async(API_KEY, city, session):
-    URL = f'https://api.openweathermap.org/data/2.5/weather?q={city}&appid={API_KEY}&units=metric'
-    async with session.get(URL) as response:
-        current_datetime = datetime.datetime.now()
-        if response.status == 200:
-            data = await response.json()
-            temperature = data['main']['temp']
-            return temperature, current_datetime
-        else:
-            raise Exception(response.text)
+async def get_city_weather_async(API_KEY, city, session, base_url=BASE_URL):
+    with stage('api.request_async'):
+        async with session.get(base_url, params=_request_params(API_KEY, city)) as response:
+            current_datetime = datetime.datetime.now()
+            if response.status == 200:
+                data = await response.json()
+                temperature = data['main']['temp']
+                return temperature, current_datetime
+            else:
+                raise WeatherAPIError(await response.text(), response.status, _retry_after(response.headers))
+
+# Повтор имеет смысл при превышении лимита запросов, ошибках сервера и сбоях сети
+def _is_retryable(error):
+    if isinstance(error, WeatherAPIError):
+        return error.status == 429 or (error.status or 0) >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, aiohttp.ClientError, asyncio.TimeoutError))
+
+# Ограничитель частоты запросов для asyncio: не более rate запросов за per секунд.
+# Ожидающие запросы выстраиваются в очередь на замке, и момент отправки выдается только
+# первому в очереди непосредственно перед отправкой; после ответа 429 отправка всех
+# ожидающих и следующих запросов откладывается на время из Retry-After.
+class AsyncRateLimiter:
+    def __init__(self, rate, per=60.0):
+        self.interval = per / rate
+        self._next = 0.0
+        self._lock = None
+        self._loop = None
+
+    async def acquire(self):
+        # Замок создается для текущего цикла событий (клиент может запускать новый цикл на каждый пакет)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        async with self._lock:
+            # После сна _next сверяется заново: defer мог отодвинуть отправку
+            while True:
+                now = time.monotonic()
+                if now >= self._next:
+                    self._next = now + self.interval
+                    return
+                await asyncio.sleep(self._next - now)
+
+    def defer(self, delay):
+        self._next = max(self._next, time.monotonic() + delay)
+
+# Клиент OpenWeatherMap: постоянный пул соединений, кэш по городу с временем жизни (TTL),
+# повторы с экспоненциальной задержкой (для 429 - по Retry-After) и пакетные запросы
+# с ограниченным числом одновременных соединений и (опционально) частотой запросов
+class WeatherClient:
+    def __init__(self, api_key, base_url=BASE_URL, ttl=600, timeout=10, max_retries=3, backoff=0.5, concurrency=10,
+                 rate_limiter=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._async_session = None
+        self._async_loop = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Закрытие пулов соединений. Асинхронную сессию лучше закрывать через aclose внутри ее цикла событий;
+    # если цикл уже завершен, ссылка на сессию просто сбрасывается
+    def close(self):
+        self.session.close()
+        if self._async_session is not None and not self._async_session.closed:
+            if not self._async_loop.is_closed() and not self._async_loop.is_running():
+                self._async_loop.run_until_complete(self.aclose())
+        self._async_session = None
+        self._async_loop = None
+
+    async def aclose(self):
+        if self._async_session is not None and not self._async_session.closed:
+            await self._async_session.close()
+        self._async_session = None
+        self._async_loop = None
+
+    # Постоянная асинхронная сессия (пул соединений) для текущего цикла событий:
+    # повторные пакеты в одном цикле (мониторинг) не открывают соединения заново
+    def _get_async_session(self):
+        loop = asyncio.get_running_loop()
+        if self._async_session is None or self._async_session.closed or self._async_loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            self._async_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._async_loop = loop
+        return self._async_session
+
+    def _cached(self, city):
+        with self._lock:
+            entry = self._cache.get(city)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _store(self, city, value):
+        with self._lock:
+            self._cache[city] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self, city=None):
+        with self._lock:
+            if city is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(city, None)
+
+    def _delay(self, error, attempt):
+        if isinstance(error, WeatherAPIError) and error.retry_after is not None:
+            return error.retry_after
+        return self.backoff * 2 ** attempt
+
+    # Текущая температура города (из кэша, пока не истек TTL)
+    def get(self, city):
+        cached = self._cached(city)
+        if cached is not None:
+            return cached
+        for attempt in range(self.max_retries + 1):
+            try:
+                value = get_city_weather(self.api_key, city, self.session, self.base_url, self.timeout)
+                return self._store(city, value)
+            except Exception as e:
+                if attempt == self.max_retries or not _is_retryable(e):
+                    raise
+                time.sleep(self._delay(e, attempt))
+
+    async def _get_async(self, city, session, semaphore):
+        cached = self._cached(city)
+        if cached is not None:
+            return cached
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire()
+                async with semaphore:
+                    value = await get_city_weather_async(self.api_key, city, session, self.base_url)
+                return self._store(city, value)
+            except Exception as e:
+                if attempt == self.max_retries or not _is_retryable(e):
+                    raise
+                delay = self._delay(e, attempt)
+                if self.rate_limiter is not None and isinstance(e, WeatherAPIError) and e.status == 429:
+                    self.rate_limiter.defer(delay)
+                await asyncio.sleep(delay)
+
+    # Пакетный запрос: словарь город -> (температура, время) или исключение для города
+    async def fetch_many_async(self, cities, concurrency=None):
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+        session = self._get_async_session()
+        tasks = [self._get_async(city, session, semaphore) for city in cities]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return dict(zip(cities, results))
+
+    # Синхронная обертка: отдельный цикл событий на вызов, сессия закрывается вместе с ним
+    def fetch_many(self, cities, concurrency=None):
+        async def run():
+            try:
+                return await self.fetch_many_async(cities, concurrency)
+            finally:
+                await self.aclose()
+        return asyncio.run(run())
 
 # функция определения: является ли текущая температура нормальной, исходя из исторических данных для текущего сезона.
 def is_temperature_normal(city, current_temp, current_datetime, season_profile):
     current_month = current_datetime.month
     current_season = month_to_season.get(current_month)
-    season_profile = season_profile[season_profile.index == current_season]
 
     if current_season in season_profile.index:
         mean_temp = season_profile.loc[current_season, 'mean']
@@ -0,0 +1,96 @@
+import contextlib
+import contextvars
+import cProfile
+import json
+import sys
+import time
+
+# Сборщик замеров по этапам: время выполнения и изменение числа выделенных блоков памяти
+# (sys.getallocatedblocks). Сборщик включается для текущего контекста (поток, задача asyncio),
+# поэтому сессии Streamlit не смешивают замеры. Когда сборщик не включен, stage() возвращает
+# общий пустой контекстный менеджер и почти ничего не стоит.
+_collector = contextvars.ContextVar('profile_collector', default=None)
+_NULL_STAGE = contextlib.nullcontext()
+
+class ProfileCollector:
+    def __init__(self, cprofile=False):
+        self.records = []
+        self.profile = cProfile.Profile() if cprofile else None
+
+    def record(self, name, seconds, blocks):
+        self.records.append((name, seconds, blocks))
+
+    # Сводка по этапам в порядке первого появления
+    def summary(self):
+        stages = {}
+        for name, seconds, blocks in self.records:
+            entry = stages.setdefault(name, {'stage': name, 'calls': 0, 'total_s': 0.0, 'max_s': 0.0, 'alloc_blocks': 0})
+            entry['calls'] += 1
+            entry['total_s'] += seconds
+            entry['max_s'] = max(entry['max_s'], seconds)
+            entry['alloc_blocks'] += blocks
+        for entry in stages.values():
+            entry['mean_s'] = entry['total_s'] / entry['calls']
+        return list(stages.values())
+
+    def to_json(self):
+        return json.dumps({
+            'stages': self.summary(),
+            'records': [{'stage': name, 'seconds': seconds, 'alloc_blocks': blocks} for name, seconds, blocks in self.records],
+        }, ensure_ascii=False, indent=2)
+
+    # Сохранение данных cProfile (для pstats/snakeviz); доступно при cprofile=True
+    def dump_cprofile(self, path):
+        if self.profile is None:
+            raise ValueError("Сборщик создан без cprofile=True")
+        self.profile.dump_stats(path)
+
+class _Stage:
+    __slots__ = ('collector', 'name', 'start', 'blocks')
+
+    def __init__(self, collector, name):
+        self.collector = collector
+        self.name = name
+
+    def __enter__(self):
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        self.collector.record(self.name, seconds, sys.getallocatedblocks() - self.blocks)
+        return False
+
+# Замер этапа: with stage('analyze_city.rolling'): ...
+def stage(name):
+    collector = _collector.get()
+    if collector is None:
+        return _NULL_STAGE
+    return _Stage(collector, name)
+
+def get_collector():
+    return _collector.get()
+
+# Включение сборщика для текущего контекста; возвращает токен для disable
+def enable(collector=None):
+    collector = collector or ProfileCollector()
+    if collector.profile is not None:
+        collector.profile.enable()
+    return _collector.set(collector)
+
+def disable(token):
+    collector = _collector.get()
+    if collector is not None and collector.profile is not None:
+        collector.profile.disable()
+    _collector.reset(token)
+
+# Замеры внутри блока: with profiling() as collector: ...
+@contextlib.contextmanager
+def profiling(collector=None):
+    collector = collector or ProfileCollector()
+    token = enable(collector)
+    try:
+        yield collector
+    finally:
+        disable(token)
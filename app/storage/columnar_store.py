@@ -0,0 +1,211 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Каталог кэша по умолчанию: один подкаталог на каждый уникальный CSV
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'weather_columnar_cache')
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+# Предельный объем кэша; сверх него удаляются давно не использованные наборы
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Колоночный набор данных на диске.
+# Строки отсортированы по (город, дата), каждая колонка хранится в отдельном .npy файле
+# и читается через memory-map, строковые колонки хранятся кодами со словарем в meta.json.
+# Индекс смещений по городам позволяет читать только строки выбранного города.
+class ColumnarDataset:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.dataset_hash = self.meta['hash']
+        self.cities = self.meta['cities']
+        self.offsets = np.asarray(self.meta['offsets'], dtype=np.int64)
+        self._city_positions = {city: i for i, city in enumerate(self.cities)}
+        self._arrays = {}
+        # Файлы колонок открываются сразу: отображение в память остается доступным,
+        # даже если каталог набора удален при очистке кэша
+        for column in self.meta['columns']:
+            if column['name'] != 'city':
+                self._column(column['name'])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def _column(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    def city_range(self, city):
+        if city not in self._city_positions:
+            raise KeyError(f"Нет данных для города {city}")
+        position = self._city_positions[city]
+        return int(self.offsets[position]), int(self.offsets[position + 1])
+
+    # Чтение строк [start, stop) в DataFrame с исходным порядком колонок
+    def _read_rows(self, start, stop):
+        columns = {}
+        for column in self.meta['columns']:
+            name = column['name']
+            if name == 'city':
+                positions = np.searchsorted(self.offsets, np.arange(start, stop), side='right') - 1
+                columns[name] = pd.Index(self.cities).take(positions)
+            elif column['dictionary'] is not None:
+                # Код -1 - пропуск в исходных данных
+                codes = np.asarray(self._column(name)[start:stop])
+                columns[name] = pd.Index(column['dictionary']).take(codes, allow_fill=True, fill_value=np.nan)
+            elif column.get('tz') is not None:
+                columns[name] = pd.DatetimeIndex(np.array(self._column(name)[start:stop])).tz_localize('UTC').tz_convert(column['tz'])
+            else:
+                columns[name] = np.array(self._column(name)[start:stop])
+        return pd.DataFrame(columns)
+
+    # Данные одного города: читаются только его строки
+    def load_city(self, city):
+        start, stop = self.city_range(city)
+        return self._read_rows(start, stop)
+
+    def to_frame(self):
+        return self._read_rows(0, len(self))
+
+    # Чтение набора порциями по chunk_rows строк (для потоковой обработки)
+    def iter_chunks(self, chunk_rows=1_000_000):
+        for start in range(0, len(self), chunk_rows):
+            yield self._read_rows(start, min(start + chunk_rows, len(self)))
+
+# Хэш содержимого файла: ключ для кэша
+def content_hash(raw):
+    return hashlib.sha256(raw).hexdigest()
+
+# Файл описания набора: города, смещения их строк и колонки (со словарями для строковых)
+def write_meta(path, dataset_hash, cities, offsets, columns):
+    meta = {
+        'version': FORMAT_VERSION,
+        'hash': dataset_hash,
+        'cities': [str(city) for city in cities],
+        'offsets': [int(offset) for offset in offsets],
+        'columns': columns,
+    }
+    with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+# Атомарная публикация: набор собирается во временном каталоге и переименовывается целиком
+def publish_dataset(tmp_path, path):
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Каталог уже создан параллельным процессом с тем же содержимым
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.exists(os.path.join(path, META_FILE)):
+            raise
+    return ColumnarDataset(path)
+
+# Запись DataFrame в колоночный формат (сортировка по городу и, если есть колонка, по дате)
+def write_frame(frame, path, dataset_hash):
+    frame = frame.reset_index(drop=True)
+    city_codes, cities = pd.factorize(frame['city'], sort=True)
+    if (city_codes < 0).any():
+        raise ValueError(f"В данных {int((city_codes < 0).sum())} строк без города (city)")
+    keys = (frame['timestamp'].to_numpy(),) if 'timestamp' in frame.columns else ()
+    order = np.lexsort(keys + (city_codes,))
+    frame = frame.take(order)
+    counts = np.bincount(city_codes, minlength=len(cities))
+
+    tmp_path = tempfile.mkdtemp(prefix='.tmp-', dir=os.path.dirname(path))
+    try:
+        columns = []
+        for name in frame.columns:
+            dictionary = None
+            tz = None
+            if name != 'city':
+                values = frame[name]
+                if isinstance(values.dtype, pd.DatetimeTZDtype):
+                    # Даты с часовым поясом хранятся в UTC, пояс - в описании колонки
+                    tz = str(values.dt.tz)
+                    values = values.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy()
+                elif values.dtype.kind in 'biufcmM':
+                    values = values.to_numpy()
+                else:
+                    codes, uniques = pd.factorize(values, sort=True)
+                    values = codes.astype(np.int8 if len(uniques) < 128 else np.int32)
+                    dictionary = [str(value) for value in uniques]
+                if values.dtype.kind == 'O':
+                    raise ValueError(f"Колонку {name} нельзя сохранить в колоночном формате: тип {frame[name].dtype}")
+                np.save(os.path.join(tmp_path, f'{name}.npy'), values)
+            columns.append({'name': name, 'dictionary': dictionary, 'tz': tz})
+        write_meta(tmp_path, dataset_hash, cities, np.concatenate(([0], np.cumsum(counts))), columns)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return publish_dataset(tmp_path, path)
+
+def _directory_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return size
+
+# Очистка кэша: наборы удаляются, начиная с давно не использованных (время изменения meta.json
+# обновляется при каждом обращении), пока общий объем больше max_bytes. Набор keep не удаляется
+def prune_cache(cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES, keep=None):
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        meta_path = os.path.join(path, META_FILE)
+        if name.startswith('.tmp-') or not os.path.exists(meta_path):
+            continue
+        try:
+            entries.append((os.path.getmtime(meta_path), path, _directory_size(path)))
+        except OSError:
+            continue
+    total = sum(size for _, _, size in entries)
+    removed = []
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed.append(path)
+    return removed
+
+# Загрузка CSV через кэш: текст разбирается только при первой встрече содержимого.
+# После записи нового набора кэш сокращается до max_cache_bytes (None - без ограничения)
+def ingest_csv(source, cache_dir=DEFAULT_CACHE_DIR, max_cache_bytes=DEFAULT_CACHE_MAX_BYTES):
+    if hasattr(source, 'getvalue'):
+        raw = source.getvalue()
+    elif hasattr(source, 'read'):
+        raw = source.read()
+    else:
+        with open(source, 'rb') as f:
+            raw = f.read()
+
+    dataset_hash = content_hash(raw)
+    path = os.path.join(cache_dir, dataset_hash)
+    meta_path = os.path.join(path, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as f:
+            current = json.load(f).get('version') == FORMAT_VERSION
+        if current:
+            # Отметка использования для очистки кэша
+            os.utime(meta_path)
+            return ColumnarDataset(path)
+        shutil.rmtree(path, ignore_errors=True)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    frame = pd.read_csv(io.BytesIO(raw), parse_dates=['timestamp'])
+    dataset = write_frame(frame, path, dataset_hash)
+    if max_cache_bytes is not None:
+        prune_cache(cache_dir, max_cache_bytes, keep=path)
+    return dataset
@@ -0,0 +1,40 @@
+import numpy as np
+
+# Индексы точек по алгоритму Largest-Triangle-Three-Buckets (LTTB):
+# форма ряда сохраняется, первая и последняя точки всегда остаются.
+# Цикл идет по корзинам (их число равно n_out), работа внутри корзины векторная.
+def lttb_indices(x, y, n_out):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Вершина треугольника в следующей корзине - ее центр масс
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        indices[i + 1] = previous
+    return indices
+
+# Индексы для отрисовки ряда: LTTB по конечным значениям плюс обязательные точки keep
+# (например, аномалии), которые остаются всегда
+def downsample_indices(x, y, n_out, keep=None):
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.flatnonzero(np.isfinite(y))
+    selected = finite[lttb_indices(np.asarray(x, dtype=np.float64)[finite], y[finite], n_out)]
+    if keep is not None:
+        selected = np.union1d(selected, np.asarray(keep, dtype=np.int64))
+    return selected
@@ -0,0 +1,122 @@
+import io
+import numpy as np
+from matplotlib.figure import Figure
+from .downsampling import downsample_indices
+
+DPI = 100
+
+# Число точек ряда по ширине графика: порядка одной точки на пиксель
+def _max_points(figsize):
+    return int(figsize[0] * DPI)
+
+def _x_values(timestamps):
+    return timestamps.to_numpy().astype('datetime64[ns]').astype(np.int64)
+
+# Прореженный ряд: индексы строк city_data для отрисовки колонки column
+def _downsampled(city_data, column, figsize, keep=None):
+    indices = downsample_indices(_x_values(city_data['timestamp']), city_data[column].to_numpy(), _max_points(figsize), keep)
+    return city_data['timestamp'].iloc[indices], city_data[column].iloc[indices]
+
+# График временного ряда температур с выделением аномалий (точки аномалий сохраняются всегда)
+def timeseries_figure(results, figsize=(10, 6)):
+    city_data = results['city_data']
+    anomalies = results['anomalies']
+    fig = Figure(figsize=figsize, dpi=DPI)
+    ax = fig.subplots()
+    keep = np.flatnonzero(city_data['anomaly'].to_numpy())
+    ax.plot(*_downsampled(city_data, 'temperature', figsize, keep), label="Температура", color='blue')
+    ax.scatter(anomalies['timestamp'], anomalies['temperature'], color='red', label="Аномалии", zorder=5)
+    ax.plot(*_downsampled(city_data, '30_day_roll_mean', figsize), label="Скользящее среднее (30 дней)", color='orange', linestyle='-')
+    ax.set_title("Временной ряд температур")
+    ax.set_xlabel("Дата")
+    ax.set_ylabel("Температура")
+    ax.legend()
+    ax.grid(True)
+    return fig
+
+# График сезонного профиля
+def season_profile_figure(results, figsize=(8, 5)):
+    season_profile = results['season_profile']
+    fig = Figure(figsize=figsize, dpi=DPI)
+    ax = fig.subplots()
+    ax.errorbar(
+        season_profile.index,
+        season_profile['mean'],
+        yerr=season_profile['std'],
+        fmt='o',
+        label='Средняя температура в пределах ст. откл.',
+        color='orange'
+    )
+    ax.set_title("Сезонный профиль")
+    ax.set_xlabel("Сезон")
+    ax.set_ylabel("Температура")
+    ax.legend()
+    ax.grid(True)
+    return fig
+
+# График скользящего среднего для сезонного профиля; полоса строится по тем же точкам, что и линия
+def season_rolling_figure(results, figsize=(10, 6)):
+    city_data = results['city_data']
+    fig = Figure(figsize=figsize, dpi=DPI)
+    ax = fig.subplots()
+    timestamps, roll_mean = _downsampled(city_data, 'season_roll_mean', figsize)
+    roll_std = city_data['season_roll_std'].loc[roll_mean.index]
+    ax.plot(timestamps, roll_mean, color='purple', label='Скользящее среднее')
+    ax.fill_between(
+        timestamps,
+        roll_mean - roll_std,
+        roll_mean + roll_std,
+        color='lightblue',
+        alpha=0.5,
+        label='Стандартное отклонение'
+    )
+    ax.set_title("Сезонный профиль (скользящее среднее)")
+    ax.set_xlabel("Дата")
+    ax.set_ylabel("Температура")
+    ax.legend()
+    ax.grid(True)
+    return fig
+
+# Гистограмма распределения температур
+def histogram_figure(results, figsize=(10, 6)):
+    fig = Figure(figsize=figsize, dpi=DPI)
+    ax = fig.subplots()
+    ax.hist(results['city_data']['temperature'], bins=30, color='skyblue', edgecolor='black')
+    ax.set_title(f"Гистограмма распределения температур в городе {results['city']}")
+    ax.set_xlabel("Температура")
+    ax.set_ylabel("Частота")
+    ax.grid(True)
+    return fig
+
+# Временной ряд с линией тренда от начальной температуры
+def trend_figure(results, figsize=(10, 6)):
+    city_data = results['city_data']
+    start_temp = city_data['temperature'].iloc[0]  # Начальная температура
+    start_date = city_data['timestamp'].iloc[0]  # Начальная дата
+    fig = Figure(figsize=figsize, dpi=DPI)
+    ax = fig.subplots()
+    timestamps, temperature = _downsampled(city_data, 'temperature', figsize)
+    trend_y = start_temp + results['trend_slope'] * (timestamps - start_date).dt.days
+    ax.plot(timestamps, temperature, label="Температура", color='blue')
+    ax.plot(timestamps, trend_y, label="Линия тренда", color='red', linestyle='--')
+    ax.set_title("Временной ряд температур с линией тренда")
+    ax.set_xlabel("Дата")
+    ax.set_ylabel("Температура")
+    ax.legend()
+    ax.grid(True)
+    return fig
+
+VIEWS = {
+    'timeseries': timeseries_figure,
+    'season_profile': season_profile_figure,
+    'season_rolling': season_rolling_figure,
+    'histogram': histogram_figure,
+    'trend': trend_figure,
+}
+
+# Отрисовка графика в PNG
+def render_png(view, results):
+    fig = VIEWS[view](results)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
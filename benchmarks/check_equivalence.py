@@ -0,0 +1,129 @@
+import argparse
+import json
+import math
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from app.analysis.data_analysis import analyze_all_cities
+from app.analysis.incremental import IncrementalCityAnalyzer
+from app.analysis.streaming import StreamingAnalyzer, analyze_chunks, analyze_csv_chunked
+from app.storage.columnar_store import ingest_csv
+
+# Проверка совпадения пошагового и потокового анализа с полным расчетом analyze_all_cities.
+# Накопление агрегатов (объединение по Чану, перенос хвостов окон) чувствительно к ошибкам,
+# поэтому проверка запускается после изменений в функциях анализа.
+# Запуск из корня проекта: python -m benchmarks.check_equivalence
+
+RTOL = 1e-9
+ATOL = 1e-9
+SCALARS = ('trend_slope', 'avg_temp', 'min_temp', 'max_temp')
+ANOMALY_COLUMNS = ['city', 'timestamp', 'temperature', 'season', '30_day_roll_mean', '30_day_roll_std']
+
+def _anomaly_frame(anomalies):
+    frame = anomalies[ANOMALY_COLUMNS].reset_index(drop=True)
+    return frame.astype({'city': str, 'season': str, 'timestamp': 'datetime64[ns]'})
+
+# Сравнение результата с эталоном analyze_all_cities (без city_data); возвращает список расхождений
+def compare_results(expected, actual, context):
+    errors = []
+    for key in SCALARS:
+        if not math.isclose(float(expected[key]), float(actual[key]), rel_tol=RTOL, abs_tol=ATOL):
+            errors.append(f"{context}: {key} {expected[key]} != {actual[key]}")
+    for key in ('season_profile', 'season_roll_profile'):
+        try:
+            pd.testing.assert_frame_equal(expected[key], actual[key], check_exact=False, rtol=RTOL, atol=ATOL,
+                                          check_index_type=False, check_column_type=False)
+        except AssertionError as e:
+            errors.append(f"{context}: {key}: {e}")
+    try:
+        pd.testing.assert_frame_equal(_anomaly_frame(expected['anomalies']), _anomaly_frame(actual['anomalies']),
+                                      check_exact=False, rtol=RTOL, atol=ATOL)
+    except AssertionError as e:
+        errors.append(f"{context}: anomalies: {e}")
+    return errors
+
+# IncrementalCityAnalyzer: вся история сразу; история частями (extend, построчный update)
+# с сохранением состояния в JSON между частями
+def check_incremental(df, reference, data_path):
+    errors = []
+    for city, expected in reference.items():
+        city_data = df[df['city'] == city]
+        errors += compare_results(expected, IncrementalCityAnalyzer.from_history(df, city).result(), f"incremental/{city}/history")
+
+        first, second = int(len(city_data) * 0.6), int(len(city_data) * 0.6) + 100
+        analyzer = IncrementalCityAnalyzer(city)
+        analyzer.extend(city_data.iloc[:first])
+        analyzer = IncrementalCityAnalyzer.from_dict(json.loads(json.dumps(analyzer.to_dict())))
+        for row in city_data.iloc[first:second].itertuples(index=False):
+            analyzer.update(row.timestamp, row.temperature, row.season)
+        analyzer = IncrementalCityAnalyzer.from_dict(json.loads(json.dumps(analyzer.to_dict())))
+        analyzer.extend(city_data.iloc[second:])
+        errors += compare_results(expected, analyzer.result(), f"incremental/{city}/parts")
+    return errors
+
+def _compare_all(reference, results, context):
+    errors = []
+    missing = sorted(set(reference) ^ set(results))
+    if missing:
+        errors.append(f"{context}: разные наборы городов: {missing}")
+    for city in set(reference) & set(results):
+        errors += compare_results(reference[city], results[city], f"{context}/{city}")
+    return errors
+
+def _chunks(df, size):
+    return (df.iloc[start:start + size] for start in range(0, len(df), size))
+
+# StreamingAnalyzer: порции с городами подряд и вперемешку (по дате), границы порций
+# посреди окон, сохранение состояния в JSON между порциями, объединение анализаторов
+# по непересекающимся городам, колоночный набор и CSV порциями
+def check_streaming(df, reference, data_path):
+    errors = []
+    interleaved = df.sort_values('timestamp', kind='stable')
+    for name, frame in (('grouped', df), ('interleaved', interleaved)):
+        for size in (997, 10_000):
+            errors += _compare_all(reference, analyze_chunks(_chunks(frame, size)).results(), f"streaming/{name}/{size}")
+
+    streaming = StreamingAnalyzer()
+    for chunk in _chunks(interleaved, 4_999):
+        streaming.update(chunk)
+        streaming = StreamingAnalyzer.from_dict(json.loads(json.dumps(streaming.to_dict())))
+    errors += _compare_all(reference, streaming.results(), "streaming/json")
+
+    cities = list(reference)
+    parts = [analyze_chunks(_chunks(interleaved[interleaved['city'].isin(cities[i::3])], 2_003)) for i in range(3)]
+    merged = parts[0].merge(parts[1]).merge(parts[2])
+    errors += _compare_all(reference, merged.results(), "streaming/merge")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        dataset = ingest_csv(data_path, cache_dir)
+        errors += _compare_all(reference, analyze_chunks(dataset.iter_chunks(3_001)).results(), "streaming/columnar")
+    errors += _compare_all(reference, analyze_csv_chunked(data_path, chunksize=7_001), "streaming/csv")
+    return errors
+
+CHECKS = {
+    'incremental': check_incremental,
+    'streaming': check_streaming,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка совпадения пошагового и потокового анализа с analyze_all_cities")
+    parser.add_argument('--data', default='data_generation/temperature_data.csv')
+    parser.add_argument('--checks', nargs='+', choices=list(CHECKS), default=list(CHECKS))
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.data, parse_dates=['timestamp'])
+    df['temperature'] = df['temperature'].astype(np.float64)
+    reference = analyze_all_cities(df)
+
+    failed = False
+    for name in args.checks:
+        errors = CHECKS[name](df, reference, args.data)
+        print(f"{name}: {'OK' if not errors else f'{len(errors)} расхождений'}")
+        for error in errors:
+            print(f"  {error}")
+        failed = failed or bool(errors)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
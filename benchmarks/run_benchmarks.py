@@ -0,0 +1,198 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+import requests
+from app.analysis.data_analysis import analyze_all_cities, analyze_cities_parallel, analyze_cities_sequential, analyze_city
+from app.api.weather_api import WeatherClient, get_city_weather
+from app.storage.columnar_store import ingest_csv
+from data_generation.generation import generate_realistic_temperature_data, make_synthetic_cities, write_csv
+
+# Воспроизводимый офлайн-набор замеров производительности: анализ, загрузка данных,
+# генерация и клиент API (через локальный сервер-заглушку с задержкой).
+# Результаты выводятся в JSON для сравнения между коммитами.
+# Запуск из корня проекта: python -m benchmarks.run_benchmarks --output bench.json
+
+SEED = 42
+
+# Замер: лучшее и медианное время по repeat запускам, пиковая память - отдельным запуском с tracemalloc.
+# Первый запуск не замеряется: в него попадают отложенные импорты (sklearn в analyze_city) и прогрев кэшей.
+# tracemalloc видит только текущий процесс
+def measure(fn, repeat=3):
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'best_s': min(timings), 'median_s': float(np.median(timings)), 'peak_mb': peak / 2 ** 20}
+
+def make_dataset(num_cities, num_years):
+    temperatures = make_synthetic_cities(num_cities, SEED)
+    df = generate_realistic_temperature_data(list(temperatures), num_years, seed=SEED, temperatures=temperatures)
+    return df.sort_values('timestamp').reset_index(drop=True)
+
+def bench_analysis(sizes, years, repeat, workers):
+    results = []
+    for num_cities in sizes:
+        df = make_dataset(num_cities, years)
+        cities = df['city'].unique()
+        params = {'cities': num_cities, 'years': years, 'rows': len(df)}
+        cases = {
+            'analyze_city': lambda: analyze_city(df, cities[0]),
+            'analyze_cities_sequential': lambda: analyze_cities_sequential(df, cities),
+            'analyze_all_cities': lambda: analyze_all_cities(df),
+        }
+        if workers:
+            cases['analyze_cities_parallel'] = lambda: analyze_cities_parallel(df, cities, workers=workers)
+        for name, fn in cases.items():
+            result = {'group': 'analysis', 'name': name, 'params': params, **measure(fn, repeat)}
+            if name == 'analyze_cities_parallel':
+                result['note'] = "peak_mb - только родительский процесс, память дочерних процессов не учитывается"
+            results.append(result)
+    return results
+
+def bench_ingestion(sizes, years, repeat):
+    results = []
+    for num_cities in sizes:
+        temperatures = make_synthetic_cities(num_cities, SEED)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.csv')
+            write_csv(path, list(temperatures), years, seed=SEED, temperatures=temperatures)
+            params = {'cities': num_cities, 'years': years, 'bytes': os.path.getsize(path)}
+            cache_dirs = iter(tempfile.mkdtemp(dir=tmp) for _ in range(repeat + 2))
+            dataset = ingest_csv(path, cache_dir=os.path.join(tmp, 'warm'))
+            city = dataset.cities[0]
+            cases = {
+                'read_csv': lambda: pd.read_csv(path, parse_dates=['timestamp']).sort_values('timestamp'),
+                'ingest_csv_cold': lambda: ingest_csv(path, cache_dir=next(cache_dirs)),
+                'ingest_csv_warm': lambda: ingest_csv(path, cache_dir=os.path.join(tmp, 'warm')),
+                'load_city': lambda: dataset.load_city(city),
+            }
+            for name, fn in cases.items():
+                results.append({'group': 'ingestion', 'name': name, 'params': params, **measure(fn, repeat)})
+    return results
+
+def bench_generation(sizes, years, repeat):
+    results = []
+    for num_cities in sizes:
+        temperatures = make_synthetic_cities(num_cities, SEED)
+        params = {'cities': num_cities, 'years': years, 'rows': num_cities * years * 365}
+        fn = lambda: generate_realistic_temperature_data(list(temperatures), years, seed=SEED, temperatures=temperatures)
+        results.append({'group': 'generation', 'name': 'generate_realistic_temperature_data', 'params': params, **measure(fn, repeat)})
+    return results
+
+# Локальная заглушка OpenWeatherMap: отвечает после заданной задержки
+def start_mock_server(latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            city = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+            body = json.dumps({'name': city, 'main': {'temp': 15.0}}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    # Очередь соединений больше стандартных 5, иначе одновременные подключения ждут повтора SYN
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 1024
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def bench_api(num_cities, latency, concurrency, repeat):
+    server = start_mock_server(latency)
+    base_url = f'http://127.0.0.1:{server.server_port}/data/2.5/weather'
+    cities = [f'City {i:05d}' for i in range(num_cities)]
+    params = {'cities': num_cities, 'latency_s': latency, 'concurrency': concurrency}
+    try:
+        with requests.Session() as session:
+            def fetch_sync():
+                for city in cities:
+                    get_city_weather('benchmark', city, session, base_url)
+
+            def fetch_async():
+                # ttl=0: каждый запуск идет в сеть, а не в кэш клиента
+                with WeatherClient('benchmark', base_url, ttl=0, concurrency=concurrency) as client:
+                    client.fetch_many(cities)
+
+            return [
+                {'group': 'api', 'name': 'get_city_weather_sync', 'params': params, **measure(fetch_sync, repeat)},
+                {'group': 'api', 'name': 'fetch_many_async', 'params': params, **measure(fetch_async, repeat)},
+            ]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-замеры производительности")
+    parser.add_argument('--groups', nargs='+', choices=['analysis', 'ingestion', 'generation', 'api'],
+                        default=['analysis', 'ingestion', 'generation', 'api'])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[15, 60, 240], help="число городов в наборах")
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=0, help="замерить analyze_cities_parallel с этим числом процессов")
+    parser.add_argument('--api-cities', type=int, default=50)
+    parser.add_argument('--api-latency', type=float, default=0.05)
+    parser.add_argument('--api-concurrency', type=int, default=10)
+    parser.add_argument('--output', help="файл для результатов (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    results = []
+    if 'analysis' in args.groups:
+        results += bench_analysis(args.sizes, args.years, args.repeat, args.workers)
+    if 'ingestion' in args.groups:
+        results += bench_ingestion(args.sizes, args.years, args.repeat)
+    if 'generation' in args.groups:
+        results += bench_generation(args.sizes, args.years, args.repeat)
+    if 'api' in args.groups:
+        results += bench_api(args.api_cities, args.api_latency, args.api_concurrency, args.repeat)
+
+    report = json.dumps({'environment': environment(), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+
+if __name__ == '__main__':
+    main()
@@ -26,23 +26,135 @@ month_to_season = {12: "winter", 1: "winter", 2: "winter",
                    6: "summer", 7: "summer", 8: "summer",
                    9: "autumn", 10: "autumn", 11: "autumn"}
 
-# Генерация данных о температуре
-def generate_realistic_temperature_data(cities, num_years=10):
-    dates = pd.date_range(start="2010-01-01", periods=365 * num_years, freq="D")
-    data = []
-
-    for city in cities:
-        for date in dates:
-            season = month_to_season[date.month]
-            mean_temp = seasonal_temperatures[city][season]
-            # Добавляем случайное отклонение
-            temperature = np.random.normal(loc=mean_temp, scale=5)
-            data.append({"city": city, "timestamp": date, "temperature": temperature})
-
-    df = pd.DataFrame(data)
-    df['season'] = df['timestamp'].dt.month.map(lambda x: month_to_season[x])
-    return df
-
-# Генерация данных
-data = generate_realistic_temperature_data(list(seasonal_temperatures.keys()))
-data.to_csv('temperature_data.csv', index=False)
\ No newline at end of file
+SEASONS = ["winter", "spring", "summer", "autumn"]
+
+# Код сезона для каждого месяца (индекс 0 не используется)
+MONTH_TO_SEASON_CODE = np.array([-1] + [SEASONS.index(month_to_season[month]) for month in range(1, 13)], dtype=np.int8)
+
+# Шаг и формат даты для поддерживаемых частот
+FREQUENCIES = {
+    "D": (pd.Timedelta(days=1), "%Y-%m-%d"),
+    "h": (pd.Timedelta(hours=1), "%Y-%m-%d %H:%M:%S"),
+}
+
+# Число отсчетов времени на город
+def _periods(num_years, freq):
+    return 365 * num_years * (pd.Timedelta(days=1) // FREQUENCIES[freq][0])
+
+# Синтетические города для нагрузочных тестов: реальные профили со случайным сдвигом
+def make_synthetic_cities(num_cities, seed=None):
+    rng = np.random.default_rng(seed)
+    base = list(seasonal_temperatures.values())
+    cities = {}
+    for i in range(num_cities):
+        shift = rng.uniform(-5, 5)
+        cities[f"City {i:05d}"] = {season: temp + shift for season, temp in base[i % len(base)].items()}
+    return cities
+
+# Потоковая генерация данных о температуре порциями по chunk_rows строк.
+# Строки идут по городам, внутри города - по времени. Память не зависит от общего числа строк,
+# а при одинаковом seed результат не зависит от размера порции.
+def iter_temperature_chunks(cities, num_years=10, freq="D", seed=None, chunk_rows=1_000_000,
+                            start="2010-01-01", temperatures=None):
+    temperatures = temperatures or seasonal_temperatures
+    cities = list(dict.fromkeys(cities))
+    periods = _periods(num_years, freq)
+    base = np.array([[temperatures[city][season] for season in SEASONS] for city in cities], dtype=np.float64)
+    city_names = np.array(cities, dtype=object)
+    season_names = np.array(SEASONS, dtype=object)
+    start = np.datetime64(pd.Timestamp(start).to_datetime64(), "ns")
+    step = FREQUENCIES[freq][0].to_timedelta64().astype("m8[ns]")
+    rng = np.random.default_rng(seed)
+
+    total_rows = periods * len(cities)
+    for chunk_start in range(0, total_rows, chunk_rows):
+        rows = np.arange(chunk_start, min(chunk_start + chunk_rows, total_rows), dtype=np.int64)
+        city_idx = rows // periods
+        timestamps = start + (rows % periods) * step
+        season_idx = MONTH_TO_SEASON_CODE[pd.DatetimeIndex(timestamps).month.to_numpy()]
+        # Добавляем случайное отклонение
+        temperature = rng.normal(loc=base[city_idx, season_idx], scale=5)
+        yield pd.DataFrame({
+            "city": city_names[city_idx],
+            "timestamp": timestamps,
+            "temperature": temperature,
+            "season": season_names[season_idx],
+        })
+
+# Генерация данных о температуре целиком в памяти
+def generate_realistic_temperature_data(cities, num_years=10, freq="D", seed=None, temperatures=None):
+    return pd.concat(list(iter_temperature_chunks(cities, num_years, freq, seed, temperatures=temperatures)), ignore_index=True)
+
+# Потоковая запись в CSV
+def write_csv(path, cities, num_years=10, freq="D", seed=None, chunk_rows=1_000_000, temperatures=None):
+    date_format = FREQUENCIES[freq][1]
+    chunks = iter_temperature_chunks(cities, num_years, freq, seed, chunk_rows, temperatures=temperatures)
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False, date_format=date_format)
+
+# Потоковая запись в колоночный формат app/storage/columnar_store.py:
+# колонки заранее выделяются как .npy с memory-map и заполняются порциями
+def write_columnar(path, cities, num_years=10, freq="D", seed=None, chunk_rows=1_000_000, temperatures=None):
+    import hashlib
+    import json
+    import os
+    import shutil
+    import tempfile
+    from app.storage.columnar_store import META_FILE, publish_dataset, write_meta
+
+    cities = list(dict.fromkeys(cities))
+    periods = _periods(num_years, freq)
+    total_rows = periods * len(cities)
+    params = {"cities": cities, "num_years": num_years, "freq": freq, "seed": seed}
+    dataset_hash = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    season_dictionary = sorted(SEASONS)
+    season_recode = np.array([season_dictionary.index(season) for season in SEASONS], dtype=np.int8)
+    columns = {
+        "timestamp": np.lib.format.open_memmap(os.path.join(tmp_path, "timestamp.npy"), mode="w+", dtype="M8[ns]", shape=(total_rows,)),
+        "temperature": np.lib.format.open_memmap(os.path.join(tmp_path, "temperature.npy"), mode="w+", dtype=np.float64, shape=(total_rows,)),
+        "season": np.lib.format.open_memmap(os.path.join(tmp_path, "season.npy"), mode="w+", dtype=np.int8, shape=(total_rows,)),
+    }
+    offset = 0
+    for chunk in iter_temperature_chunks(cities, num_years, freq, seed, chunk_rows, temperatures=temperatures):
+        stop = offset + len(chunk)
+        columns["timestamp"][offset:stop] = chunk["timestamp"].to_numpy()
+        columns["temperature"][offset:stop] = chunk["temperature"].to_numpy()
+        season_codes = pd.Categorical(chunk["season"], categories=SEASONS).codes
+        columns["season"][offset:stop] = season_recode[season_codes]
+        offset = stop
+    for column in columns.values():
+        column.flush()
+    del columns
+
+    write_meta(tmp_path, dataset_hash, cities, np.arange(len(cities) + 1) * periods, [
+        {"name": "city", "dictionary": None},
+        {"name": "timestamp", "dictionary": None},
+        {"name": "temperature", "dictionary": None},
+        {"name": "season", "dictionary": season_dictionary},
+    ])
+    # Ранее сгенерированный набор по тому же пути заменяется
+    if os.path.exists(os.path.join(path, META_FILE)):
+        shutil.rmtree(path)
+    return publish_dataset(tmp_path, path)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Генерация искусственных данных о температуре")
+    parser.add_argument("--output", default="temperature_data.csv", help="CSV файл или каталог колоночного набора")
+    parser.add_argument("--format", choices=["csv", "columnar"], default="csv")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--freq", choices=sorted(FREQUENCIES), default="D")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--synthetic-cities", type=int, default=0, help="число синтетических городов вместо реальных")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    temperatures = make_synthetic_cities(args.synthetic_cities, args.seed) if args.synthetic_cities else seasonal_temperatures
+    writer = write_columnar if args.format == "columnar" else write_csv
+    # Генерация данных
+    writer(args.output, list(temperatures), args.years, args.freq, args.seed, args.chunk_rows, temperatures)